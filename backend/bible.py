@@ -0,0 +1,279 @@
+"""Local Portuguese Bible index for verse lookup and reference validation.
+
+The text lives in a compact binary file that is memory-mapped read-only, so
+every worker shares the same pages and a lookup is a binary search over a
+fixed-size table:
+
+    header   magic "BIBL", version (u16), verse count (u32)
+    entries  count x (key u32, offset u32, length u32), sorted by key
+    text     UTF-8 verse texts, back to back
+
+where ``key = book << 16 | chapter << 8 | verse`` and ``book`` is the 1-based
+canonical book number. Chapters and verses therefore go up to 255 (the
+longest are Psalms, with 150 chapters, and Psalm 119, with 176 verses);
+anything larger is rejected rather than allowed to spill into the next
+field. Build the file from a public-domain translation (for
+example Almeida 1911) with::
+
+    python bible.py build almeida.json data/bible_pt.idx
+
+The source JSON is a list of the 66 books in canonical order, each with a
+``chapters`` list of lists of verse strings.
+"""
+
+import json
+import mmap
+import re
+import struct
+import sys
+import unicodedata
+from typing import List, Optional, Tuple
+
+MAGIC = b"BIBL"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ENTRY = struct.Struct("<III")
+# Chapter and verse numbers each get 8 bits of the key
+MAX_NUMBER = 255
+
+# (canonical name, aliases); abbreviations follow common Brazilian usage
+BOOKS = [
+    ("Gênesis", ["gn", "gen"]),
+    ("Êxodo", ["ex", "exo"]),
+    ("Levítico", ["lv", "lev"]),
+    ("Números", ["nm", "num"]),
+    ("Deuteronômio", ["dt", "deut"]),
+    ("Josué", ["js", "jos"]),
+    ("Juízes", ["jz", "juiz"]),
+    ("Rute", ["rt"]),
+    ("1 Samuel", ["1sm", "1sam"]),
+    ("2 Samuel", ["2sm", "2sam"]),
+    ("1 Reis", ["1rs"]),
+    ("2 Reis", ["2rs"]),
+    ("1 Crônicas", ["1cr", "1cron"]),
+    ("2 Crônicas", ["2cr", "2cron"]),
+    ("Esdras", ["ed", "esd"]),
+    ("Neemias", ["ne", "nee"]),
+    ("Ester", ["et", "est"]),
+    ("Jó", ["jó"]),
+    ("Salmos", ["sl", "salmo", "sal"]),
+    ("Provérbios", ["pv", "prov"]),
+    ("Eclesiastes", ["ec", "ecl"]),
+    ("Cânticos", ["ct", "cantares", "cânticodoscânticos", "cantico"]),
+    ("Isaías", ["is", "isa"]),
+    ("Jeremias", ["jr", "jer"]),
+    ("Lamentações", ["lm", "lam"]),
+    ("Ezequiel", ["ez", "eze"]),
+    ("Daniel", ["dn", "dan"]),
+    ("Oseias", ["os", "oséias"]),
+    ("Joel", ["jl"]),
+    ("Amós", ["am"]),
+    ("Obadias", ["ob"]),
+    ("Jonas", ["jn"]),
+    ("Miqueias", ["mq", "miquéias"]),
+    ("Naum", ["na"]),
+    ("Habacuque", ["hc", "hab"]),
+    ("Sofonias", ["sf", "sof"]),
+    ("Ageu", ["ag"]),
+    ("Zacarias", ["zc", "zac"]),
+    ("Malaquias", ["ml", "mal"]),
+    ("Mateus", ["mt"]),
+    ("Marcos", ["mc"]),
+    ("Lucas", ["lc"]),
+    ("João", ["jo"]),
+    ("Atos", ["at", "atosdosapóstolos"]),
+    ("Romanos", ["rm", "rom"]),
+    ("1 Coríntios", ["1co", "1cor"]),
+    ("2 Coríntios", ["2co", "2cor"]),
+    ("Gálatas", ["gl", "gal"]),
+    ("Efésios", ["ef", "efe"]),
+    ("Filipenses", ["fp", "fl", "fil"]),
+    ("Colossenses", ["cl", "col"]),
+    ("1 Tessalonicenses", ["1ts", "1tes"]),
+    ("2 Tessalonicenses", ["2ts", "2tes"]),
+    ("1 Timóteo", ["1tm", "1tim"]),
+    ("2 Timóteo", ["2tm", "2tim"]),
+    ("Tito", ["tt"]),
+    ("Filemom", ["fm", "filemon"]),
+    ("Hebreus", ["hb", "heb"]),
+    ("Tiago", ["tg"]),
+    ("1 Pedro", ["1pe", "1pd"]),
+    ("2 Pedro", ["2pe", "2pd"]),
+    ("1 João", ["1jo"]),
+    ("2 João", ["2jo"]),
+    ("3 João", ["3jo"]),
+    ("Judas", ["jd"]),
+    ("Apocalipse", ["ap", "apoc"]),
+]
+
+_ROMAN_PREFIX = re.compile(r"^(iii|ii|i)(?=\s)")
+_REFERENCE = re.compile(r"^\s*(.+?)\s*(\d{1,3})\s*[:.,]\s*(\d{1,3})(?:\s*[-–]\s*(\d{1,3}))?")
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def _book_key(name: str) -> str:
+    key = name.lower().strip().rstrip(".")
+    key = _ROMAN_PREFIX.sub(lambda m: str(len(m.group(1))), key)
+    return re.sub(r"[\s.]", "", key)
+
+
+def _build_aliases():
+    exact, folded = {}, {}
+    for number, (name, aliases) in enumerate(BOOKS, start=1):
+        for alias in [name] + aliases:
+            key = _book_key(alias)
+            exact.setdefault(key, number)
+            folded.setdefault(_strip_accents(key), number)
+    # "Jo" is João; Jó must be written with its accent
+    folded["jo"] = exact["jo"]
+    return exact, folded
+
+
+_EXACT_ALIASES, _FOLDED_ALIASES = _build_aliases()
+
+
+def find_book(name: str) -> Optional[int]:
+    key = _book_key(name)
+    return _EXACT_ALIASES.get(key) or _FOLDED_ALIASES.get(_strip_accents(key))
+
+
+class Reference:
+    __slots__ = ("book", "chapter", "verse_start", "verse_end")
+
+    def __init__(self, book: int, chapter: int, verse_start: int, verse_end: int):
+        self.book = book
+        self.chapter = chapter
+        self.verse_start = verse_start
+        self.verse_end = verse_end
+
+    @property
+    def book_name(self) -> str:
+        return BOOKS[self.book - 1][0]
+
+    def __str__(self):
+        verses = str(self.verse_start)
+        if self.verse_end != self.verse_start:
+            verses += f"-{self.verse_end}"
+        return f"{self.book_name} {self.chapter}:{verses}"
+
+
+def parse_reference(text: str) -> Optional[Reference]:
+    """Parse references such as "Filipenses 4:7", "1 Co 13.4-7" or "Salmo 23:1 (ARC)"."""
+    match = _REFERENCE.match(text or "")
+    if not match:
+        return None
+    book = find_book(match.group(1))
+    if book is None:
+        return None
+    chapter, start = int(match.group(2)), int(match.group(3))
+    end = int(match.group(4)) if match.group(4) else start
+    if not 1 <= chapter <= MAX_NUMBER or not 1 <= start <= end <= MAX_NUMBER:
+        return None
+    return Reference(book, chapter, start, end)
+
+
+def verse_key(book: int, chapter: int, verse: int) -> int:
+    if not (1 <= book <= len(BOOKS) and 1 <= chapter <= MAX_NUMBER and 1 <= verse <= MAX_NUMBER):
+        raise ValueError(f"Verse {book}:{chapter}:{verse} is outside the index key range")
+    return book << 16 | chapter << 8 | verse
+
+
+class BibleIndex:
+    """Read-only, memory-mapped verse index."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Bible index")
+        self._entries_at = HEADER.size
+        self._text_at = HEADER.size + self.count * ENTRY.size
+
+    def _entry(self, i: int) -> Tuple[int, int, int]:
+        return ENTRY.unpack_from(self._map, self._entries_at + i * ENTRY.size)
+
+    def get(self, book: int, chapter: int, verse: int) -> Optional[str]:
+        try:
+            key = verse_key(book, chapter, verse)
+        except ValueError:
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, offset, length = self._entry(mid)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                start = self._text_at + offset
+                return self._map[start:start + length].decode("utf-8")
+        return None
+
+    def passage(self, reference: Reference) -> Optional[List[Tuple[int, str]]]:
+        """Verses of ``reference``; None if any of them does not exist."""
+        verses = []
+        for number in range(reference.verse_start, reference.verse_end + 1):
+            text = self.get(reference.book, reference.chapter, number)
+            if text is None:
+                return None
+            verses.append((number, text))
+        return verses
+
+    def close(self):
+        self._map.close()
+
+
+def build_index(source_path: str, out_path: str) -> int:
+    with open(source_path, encoding="utf-8-sig") as f:
+        books = json.load(f)
+    if len(books) != len(BOOKS):
+        raise ValueError(f"Expected {len(BOOKS)} books, found {len(books)}")
+
+    entries, blob = [], bytearray()
+    for book_number, book in enumerate(books, start=1):
+        for chapter_number, chapter in enumerate(book["chapters"], start=1):
+            for verse_number, text in enumerate(chapter, start=1):
+                data = " ".join(text.split()).encode("utf-8")
+                entries.append((verse_key(book_number, chapter_number, verse_number), len(blob), len(data)))
+                blob += data
+    entries.sort()
+
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+        f.write(blob)
+
+    verify_index(books, out_path)
+    return len(entries)
+
+
+def verify_index(books: list, path: str):
+    """Read every verse back from a built index and check the key limits."""
+    index = BibleIndex(path)
+    try:
+        for book_number, book in enumerate(books, start=1):
+            for chapter_number, chapter in enumerate(book["chapters"], start=1):
+                for verse_number, text in enumerate(chapter, start=1):
+                    if index.get(book_number, chapter_number, verse_number) != " ".join(text.split()):
+                        raise ValueError(f"Index round trip failed at {book_number}:{chapter_number}:{verse_number}")
+                # Past the end of the chapter, and past the key range, nothing may be found
+                if index.get(book_number, chapter_number, len(chapter) + 1) is not None:
+                    raise ValueError(f"Index has extra verses in {book_number}:{chapter_number}")
+                if index.get(book_number, chapter_number, MAX_NUMBER + 1) is not None:
+                    raise ValueError(f"Index accepts verse numbers above {MAX_NUMBER}")
+            if index.get(book_number, MAX_NUMBER + 1, 1) is not None:
+                raise ValueError(f"Index accepts chapter numbers above {MAX_NUMBER}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        sys.exit("usage: python bible.py build <source.json> <index file>")
+    print(f"Indexed {build_index(sys.argv[2], sys.argv[3])} verses")
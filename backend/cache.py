@@ -0,0 +1,343 @@
+"""Two-tier cache used by the API: a per-process LRU (near-cache) in front of
+an optional shared tier that speaks the Redis command set.
+
+With a single uvicorn worker the near-cache is enough. With several workers,
+point ``CACHE_REDIS_URL`` at a Redis-compatible server (Redis, Valkey, KeyDB)
+so every worker shares the same entries; writes and invalidations are
+broadcast over pub/sub so near-cache copies are dropped everywhere.
+"""
+
+import asyncio
+import json
+import logging
+import pickle
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional dependency, only needed for a Redis shared tier
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded in-process LRU with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class LocalSharedBackend:
+    """In-process stand-in for Redis implementing the commands the cache uses.
+
+    Handy for development and tests; it is not shared between processes.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._handlers: Dict[str, list] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        if nx and await self.get(key) is not None:
+            return False
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        return True
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def publish(self, channel: str, message: bytes):
+        for handler in self._handlers.get(channel, []):
+            handler(message)
+
+    async def subscribe(self, channel: str, handler: Callable[[bytes], None]):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def close(self):
+        self._handlers.clear()
+
+
+class RedisSharedBackend:
+    """Shared tier backed by any server speaking the Redis protocol."""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but the 'redis' package is not installed")
+        self._redis = aioredis.from_url(url)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, Callable[[bytes], None]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        px = int(ttl * 1000) if ttl else None
+        return bool(await self._redis.set(key, value, px=px, nx=nx))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def publish(self, channel: str, message: bytes):
+        await self._redis.publish(channel, message)
+
+    async def subscribe(self, channel: str, handler: Callable[[bytes], None]):
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(channel)
+        self._handlers[channel] = handler
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    handler = self._handlers.get(channel)
+                    if handler:
+                        handler(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache pub/sub listener error: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.reset()
+        close = getattr(self._redis, "aclose", None) or self._redis.close
+        await close()
+
+
+def make_shared_backend(url: Optional[str]):
+    """Build the shared tier from ``CACHE_REDIS_URL`` (``local://`` selects the stand-in)."""
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalSharedBackend()
+    return RedisSharedBackend(url)
+
+
+class TieredCache:
+    """Near-cache in front of an optional shared tier for one key namespace.
+
+    Values are pickled in the shared tier. Concurrent misses for the same key
+    are coalesced into a single load in this process, and a short-lived lock
+    in the shared tier keeps other workers from loading the same key at once.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        shared=None,
+        maxsize: int = 1024,
+        ttl: float = 60,
+        local_ttl: Optional[float] = None,
+        lock_timeout: float = 10.0,
+    ):
+        self.namespace = namespace
+        self.shared = shared
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self.local = LRUCache(maxsize)
+        self.loads = 0
+        self.coalesced = 0
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self._channel = f"cache:{namespace}:invalidate"
+        self._origin = uuid.uuid4().hex
+
+    def _key(self, key) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _near_ttl(self, ttl: float) -> float:
+        # Kept short so a missed invalidation cannot serve stale data for long;
+        # without a shared tier, invalidations never reach the other workers at all
+        if self.local_ttl is None:
+            return ttl
+        return min(ttl, self.local_ttl)
+
+    async def _shared_call(self, op: str, *args, default=None, **kwargs):
+        try:
+            return await getattr(self.shared, op)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Shared cache {op} failed for {self.namespace}: {str(e)}")
+            return default
+
+    async def start(self):
+        if self.shared is not None:
+            await self._shared_call("subscribe", self._channel, self._on_invalidate)
+
+    def _on_invalidate(self, message: bytes):
+        payload = json.loads(message)
+        if payload.get("origin") == self._origin:
+            return
+        for key in payload.get("keys", []):
+            self.local.delete(key)
+
+    async def _broadcast(self, keys):
+        message = json.dumps({"origin": self._origin, "keys": list(keys)}).encode()
+        await self._shared_call("publish", self._channel, message)
+
+    async def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.shared is not None:
+            raw = await self._shared_call("get", self._key(key))
+            if raw is not None:
+                value = pickle.loads(raw)
+                self.local.set(key, value, self._near_ttl(self.ttl))
+                return value
+        return default
+
+    async def set(self, key, value, ttl: Optional[float] = None, broadcast: bool = True):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, self._near_ttl(ttl))
+        if self.shared is not None:
+            await self._shared_call("set", self._key(key), pickle.dumps(value), ttl=ttl)
+            if broadcast:
+                await self._broadcast([key])
+
+    async def invalidate(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        if self.shared is not None and keys:
+            await self._shared_call("delete", *[self._key(k) for k in keys])
+            await self._broadcast(keys)
+
+    async def get_or_load(self, key, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        """Return the cached value or run ``loader`` once for all concurrent callers.
+
+        ``None`` results are returned but not cached.
+        """
+        value = await self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader, ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, key, loader, ttl):
+        lock_key = None
+        if self.shared is not None:
+            lock_key = self._key(key) + ":lock"
+            acquired = await self._shared_call("set", lock_key, b"1", ttl=self.lock_timeout, nx=True, default=True)
+            if not acquired:
+                value = await self._wait_for_peer(key)
+                if value is not _MISSING:
+                    return value
+                lock_key = None
+        try:
+            value = await loader()
+        finally:
+            if lock_key is not None:
+                await self._shared_call("delete", lock_key)
+        self.loads += 1
+        if value is not None:
+            await self.set(key, value, ttl, broadcast=False)
+        return value
+
+    async def _wait_for_peer(self, key):
+        # Another worker holds the load lock: poll the shared tier until it
+        # publishes the value or the lock would have expired.
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            raw = await self._shared_call("get", self._key(key))
+            if raw is not None:
+                value = pickle.loads(raw)
+                self.local.set(key, value, self._near_ttl(self.ttl))
+                return value
+        return _MISSING
+
+    def stats(self) -> dict:
+        return {
+            "namespace": self.namespace,
+            "shared": self.shared is not None,
+            "near": self.local.stats(),
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,149 @@
+"""Response compression.
+
+``CompressionMiddleware`` gzip/brotli-compresses complete responses above a
+size threshold. ``PrecompressedPayload`` is for cacheable shared payloads: the
+JSON body and its compressed variants are produced once, stored in the cache
+next to each other and served as-is, so hot responses cost no CPU per request.
+
+Brotli is optional; without the ``brotli`` package only gzip is offered.
+"""
+
+import gzip
+import json
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "image/svg+xml", "text/")
+
+
+def available_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str] = None) -> Optional[str]:
+    """Pick the best encoding the client accepts, preferring brotli."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token] = quality
+    for encoding in available if available is not None else available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
+
+
+def render_json(content) -> bytes:
+    # Same rendering as FastAPI's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class PrecompressedPayload:
+    """JSON body rendered once, with its gzip/brotli variants kept alongside."""
+
+    def __init__(self, content, minimum_size: int = 1024, gzip_level: int = 9, brotli_quality: int = 9):
+        self.body = render_json(content)
+        self.encoded: Dict[str, bytes] = {}
+        if len(self.body) >= minimum_size:
+            for encoding in available_encodings():
+                self.encoded[encoding] = compress(self.body, encoding, gzip_level, brotli_quality)
+
+    def response(self, accept_encoding: str = "") -> Response:
+        headers = {"Vary": "Accept-Encoding"}
+        body = self.body
+        encoding = choose_encoding(accept_encoding, self.encoded) if self.encoded else None
+        if encoding is not None:
+            body = self.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class CompressionMiddleware:
+    """Compress complete (non-streaming) responses above ``minimum_size``.
+
+    Responses that already carry a Content-Encoding (such as precompressed
+    payloads) and streaming responses are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        started = False
+
+        async def send_compressed(message):
+            nonlocal start_message, started
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or started:
+                # e.g. http.response.pathsend for a file: nothing to compress
+                if not started:
+                    started = True
+                    await send(start_message)
+                await send(message)
+                return
+
+            started = True
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,219 @@
+"""``Idempotency-Key`` support for POST endpoints.
+
+The first request with a given key claims it in the ``idempotency_keys``
+collection and its response (status, headers and body) is stored there, with
+a TTL index, and in a local LRU. Retries with the same key get the stored
+response back with an ``Idempotent-Replayed: true`` header. A retry arriving
+while the first request is still running waits for it (answering 409 if it
+takes longer than ``wait_timeout``), and reusing a key for a different
+request body is rejected with 422.
+
+Keys are scoped to the caller's credentials, method and path. 5xx responses
+are not stored, so the client can retry them for real. Content-encoded
+responses (precompressed payloads) are stored decoded: a retry may accept
+different encodings, and the compression middleware outside this one encodes
+the replay for it.
+"""
+
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers, MutableHeaders
+
+from cache import LRUCache
+from compression import decompress
+
+# Set per response by other middleware; not part of the stored response
+VOLATILE_HEADERS = {b"x-request-id", b"x-profile-id"}
+MAX_KEY_LENGTH = 255
+
+
+def _json_response(status: int, detail: str) -> dict:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    return {
+        "status": status,
+        "headers": [[b"content-type", b"application/json"], [b"content-length", str(len(body)).encode()]],
+        "body": body,
+    }
+
+
+async def ensure_idempotency_indexes(db):
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, db, paths: Iterable[str], ttl_hours: float = 24, local_maxsize: int = 10000,
+                 wait_timeout: float = 30, poll_interval: float = 0.25, stale_after: float = 300):
+        self.app = app
+        self.db = db
+        self.paths = frozenset(paths)
+        self.ttl = timedelta(hours=ttl_hours)
+        self.local = LRUCache(local_maxsize, ttl=ttl_hours * 3600)
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.stale_after = timedelta(seconds=stale_after)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send(send, _json_response(400, "Invalid Idempotency-Key"))
+            return
+
+        body = await self._read_body(receive)
+        record_id = hashlib.sha256(
+            "\n".join([headers.get("authorization", ""), scope["path"], key]).encode("utf-8")
+        ).hexdigest()
+        fingerprint = hashlib.sha256(scope.get("query_string", b"") + b"\n" + body).hexdigest()
+
+        while True:
+            stored = await self._lookup(record_id)
+            if stored is not None:
+                if stored["fingerprint"] != fingerprint:
+                    await self._send(send, _json_response(422, "Idempotency-Key reused with a different request"))
+                else:
+                    await self._send(send, stored["response"], replayed=True)
+                return
+            if await self._claim(record_id, fingerprint):
+                break
+            if not await self._wait(record_id):
+                await self._send(send, _json_response(409, "A request with this Idempotency-Key is in progress"))
+                return
+
+        await self._run(scope, body, receive, send, record_id, fingerprint)
+
+    async def _read_body(self, receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _lookup(self, record_id: str) -> Optional[dict]:
+        stored = self.local.get(record_id)
+        if stored is not None:
+            return stored
+        document = await self.db.idempotency_keys.find_one({"_id": record_id, "status": "done"})
+        if document is None:
+            return None
+        response = document["response"]
+        stored = {
+            "fingerprint": document["fingerprint"],
+            "response": {"status": response["status"], "headers": response["headers"], "body": bytes(response["body"])},
+        }
+        self.local.set(record_id, stored)
+        return stored
+
+    async def _claim(self, record_id: str, fingerprint: str) -> bool:
+        if record_id in self._inflight:
+            return False
+        now = datetime.utcnow()
+        try:
+            await self.db.idempotency_keys.insert_one({
+                "_id": record_id,
+                "status": "pending",
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "expires_at": now + self.ttl,
+            })
+        except DuplicateKeyError:
+            # Take over a key left pending by a worker that died mid-request
+            taken = await self.db.idempotency_keys.find_one_and_update(
+                {"_id": record_id, "status": "pending", "created_at": {"$lt": now - self.stale_after}},
+                {"$set": {"fingerprint": fingerprint, "created_at": now}}
+            )
+            if taken is None:
+                return False
+        self._inflight[record_id] = asyncio.get_running_loop().create_future()
+        return True
+
+    async def _wait(self, record_id: str) -> bool:
+        """Wait for the request holding the key; False if it is still running at the timeout."""
+        future = self._inflight.get(record_id)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+        # Held by another worker: poll until it is stored or released
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while loop.time() < deadline:
+            document = await self.db.idempotency_keys.find_one({"_id": record_id}, {"status": 1})
+            if document is None or document["status"] == "done":
+                return True
+            await asyncio.sleep(self.poll_interval)
+        return False
+
+    async def _run(self, scope, body: bytes, receive, send, record_id: str, fingerprint: str):
+        start = None
+        chunks = []
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                # Only disconnect notifications are left
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_and_capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, replay_body, send_and_capture)
+            response = self._storable(start, b"".join(chunks)) if start is not None and start["status"] < 500 else None
+            if response is not None:
+                await self.db.idempotency_keys.update_one(
+                    {"_id": record_id},
+                    {"$set": {"status": "done", "response": dict(response, body=Binary(response["body"]))}}
+                )
+                self.local.set(record_id, {"fingerprint": fingerprint, "response": response})
+                stored = True
+        finally:
+            if not stored:
+                # Release the key so a retry runs the request again
+                await self.db.idempotency_keys.delete_one({"_id": record_id, "status": "pending"})
+            future = self._inflight.pop(record_id)
+            future.set_result(stored)
+
+    def _storable(self, start: dict, body: bytes) -> Optional[dict]:
+        """The response to store, with its body decoded; None if it cannot be decoded."""
+        headers = MutableHeaders(raw=[(k, v) for k, v in start.get("headers", []) if k.lower() not in VOLATILE_HEADERS])
+        encoding = headers.get("content-encoding")
+        if encoding is not None:
+            try:
+                body = decompress(body, encoding)
+            except Exception:
+                return None
+            del headers["content-encoding"]
+            headers["content-length"] = str(len(body))
+        return {"status": start["status"], "headers": [[k, v] for k, v in headers.raw], "body": body}
+
+    async def _send(self, send, response: dict, replayed: bool = False):
+        headers = [(bytes(k), bytes(v)) for k, v in response["headers"]]
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": response["body"]})
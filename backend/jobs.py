@@ -0,0 +1,232 @@
+"""Background job queue in MongoDB with a worker pool.
+
+Jobs live in the ``jobs`` collection and move through ``queued`` ->
+``running`` -> ``done`` / ``failed``. Claiming a job hides it from other
+workers for ``visibility_timeout`` seconds; if the claiming worker dies the
+job becomes visible again and is retried, up to ``max_attempts``. Failed
+attempts are retried with exponential backoff.
+
+Any process can enqueue; only processes started with a non-zero pool size
+run jobs, so generation throughput is sized independently of the API.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("done", "failed")
+
+
+def public_job(job: dict) -> dict:
+    data = {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"].isoformat(),
+    }
+    if job["status"] == "done":
+        data["result"] = job.get("result")
+    elif job.get("error"):
+        data["error"] = job["error"]
+    return data
+
+
+class JobQueue:
+    def __init__(self, db, visibility_timeout: float = 300, max_attempts: int = 3,
+                 retry_backoff: float = 5, retention_hours: float = 24):
+        self.db = db
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention_hours = retention_hours
+        # Wakes local workers on enqueue and local long-polls on completion
+        self._enqueued = asyncio.Event()
+        self._finished: Dict[ObjectId, asyncio.Event] = {}
+
+    async def ensure_indexes(self):
+        await self.db.jobs.create_index([("status", 1), ("available_at", 1)])
+        await self.db.jobs.create_index("dedupe_key", unique=True, sparse=True)
+        await self.db.jobs.create_index("finished_at", expireAfterSeconds=int(self.retention_hours * 3600))
+
+    async def enqueue(self, kind: str, payload: dict, owner, dedupe_key: Optional[str] = None) -> dict:
+        """Queue a job; with ``dedupe_key`` an unfinished job with the same key is returned instead."""
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "payload": payload,
+            "owner": owner,
+            "status": "queued",
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now,
+        }
+        if dedupe_key is None:
+            job["_id"] = (await self.db.jobs.insert_one(job)).inserted_id
+        else:
+            try:
+                job = await self.db.jobs.find_one_and_update(
+                    {"dedupe_key": dedupe_key, "status": {"$nin": list(FINISHED)}},
+                    {"$setOnInsert": dict(job, dedupe_key=dedupe_key)},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # A finished job still holds the key: it was a previous run, start over
+                await self.db.jobs.update_one(
+                    {"dedupe_key": dedupe_key, "status": {"$in": list(FINISHED)}},
+                    {"$unset": {"dedupe_key": ""}}
+                )
+                return await self.enqueue(kind, payload, owner, dedupe_key)
+        self._enqueued.set()
+        return job
+
+    async def get(self, job_id: ObjectId) -> Optional[dict]:
+        return await self.db.jobs.find_one({"_id": job_id})
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        # A running job whose visibility timeout expired was abandoned by a dead
+        # worker; once it has used up its attempts it fails instead of being retried
+        await self.db.jobs.update_many(
+            {"status": "running", "available_at": {"$lte": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "error": "Worker did not finish the job", "finished_at": now}}
+        )
+        return await self.db.jobs.find_one_and_update(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "available_at": {"$lte": now},
+                "attempts": {"$lt": self.max_attempts},
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": worker_id,
+                    "available_at": now + timedelta(seconds=self.visibility_timeout),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def complete(self, job: dict, worker_id: str, result):
+        await self._finish(job, worker_id, {"status": "done", "result": result})
+
+    async def fail(self, job: dict, worker_id: str, error: str):
+        if job["attempts"] < self.max_attempts:
+            delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+            await self.db.jobs.update_one(
+                {"_id": job["_id"], "worker": worker_id, "status": "running"},
+                {"$set": {
+                    "status": "queued",
+                    "error": error,
+                    "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                }}
+            )
+        else:
+            await self._finish(job, worker_id, {"status": "failed", "error": error})
+
+    async def _finish(self, job: dict, worker_id: str, fields: dict):
+        fields["finished_at"] = datetime.utcnow()
+        # Only the current owner may finish: a worker that overran its
+        # visibility timeout must not overwrite the retry's outcome
+        await self.db.jobs.update_one(
+            {"_id": job["_id"], "worker": worker_id, "status": "running"},
+            {"$set": fields}
+        )
+        event = self._finished.pop(job["_id"], None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, job_id: ObjectId, timeout: float, poll_interval: float = 1.0) -> Optional[dict]:
+        """Long-poll: return the job once finished or when ``timeout`` expires."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                # Concurrent waiters fall back to polling and re-register
+                self._finished.pop(job_id, None)
+                return job
+            # Jobs run by this process signal completion; others are polled
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def next_job(self, worker_id: str, poll_interval: float) -> dict:
+        while True:
+            job = await self.claim(worker_id)
+            if job is not None:
+                return job
+            self._enqueued.clear()
+            try:
+                await asyncio.wait_for(self._enqueued.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+Handler = Callable[[dict], Awaitable[object]]
+
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Handler], worker_id: str,
+                 concurrency: int = 2, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        for slot in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._run(f"{self.worker_id}#{slot}")))
+
+    async def _run(self, worker_id: str):
+        while True:
+            try:
+                job = await self.queue.next_job(worker_id, self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            handler = self.handlers.get(job["kind"])
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for job kind {job['kind']}")
+                result = await handler(job["payload"])
+            except asyncio.CancelledError:
+                # Left running; it becomes visible again after the timeout
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['_id']} ({job['kind']}) attempt {job['attempts']} failed: {str(e)}")
+                self.failed += 1
+                await self.queue.fail(job, worker_id, str(e))
+            else:
+                self.completed += 1
+                await self.queue.complete(job, worker_id, result)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {"concurrency": self.concurrency, "completed": self.completed, "failed": self.failed}
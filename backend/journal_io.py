@@ -0,0 +1,240 @@
+"""Streaming export and import of a user's journal.
+
+Export reads records straight from Motor cursors and encodes them chunk by
+chunk; import parses an NDJSON upload line by line and writes batches with
+``insert_many``. Either way memory stays flat whatever the size of the history.
+"""
+
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+
+from tiering import archive_name, unpack
+
+# collection -> (record type, exported fields)
+JOURNAL_COLLECTIONS = {
+    "prayers": ("prayer", ["title", "content", "category", "date"]),
+    "gratitudes": ("gratitude", ["content", "date"]),
+    "devotionals": ("devotional", ["title", "content", "verse", "verse_reference", "music_suggestions", "date"]),
+    "reflections": ("reflection", ["content", "type", "is_public", "date"]),
+}
+ARCHIVED_COLLECTIONS = ("devotionals", "reflections")
+# Stored field names that would clash with the record "type"
+EXPORT_RENAMES = {"type": "reflection_type"}
+
+CSV_COLUMNS = ["type", "id", "date", "title", "content", "category", "verse", "verse_reference", "music_suggestions", "is_public", "reflection_type"]
+
+CURSOR_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+async def iter_journal(db, user_filter: dict, resolve_music=None) -> AsyncIterator[Tuple[str, dict]]:
+    """Yield ``(record type, record)`` for every journal entry of one user.
+
+    ``resolve_music`` is awaited with ``[devotional]`` to fill in songs that
+    devotionals reference by id (see ``music.MusicCatalog.attach``).
+    """
+    for collection_name, (record_type, fields) in JOURNAL_COLLECTIONS.items():
+        sources = [(collection_name, False)]
+        if collection_name in ARCHIVED_COLLECTIONS:
+            sources.append((archive_name(collection_name), True))
+        for source, archived in sources:
+            cursor = db[source].find(user_filter).sort("date", 1).batch_size(CURSOR_BATCH_SIZE)
+            async for document in cursor:
+                if archived:
+                    document = unpack(document)
+                if resolve_music is not None and "music_ids" in document:
+                    await resolve_music([document])
+                record = {"id": str(document["_id"])}
+                for field in fields:
+                    record[EXPORT_RENAMES.get(field, field)] = _plain(document.get(field))
+                yield record_type, record
+
+
+async def ndjson_stream(records: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    async for record_type, record in records:
+        buffer.write(json.dumps({"type": record_type, **record}, ensure_ascii=False))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def csv_stream(records: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    async for record_type, record in records:
+        row = dict(record, type=record_type)
+        if row.get("music_suggestions") is not None:
+            row["music_suggestions"] = json.dumps(row["music_suggestions"], ensure_ascii=False)
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ============ IMPORT ============
+
+def _normalize_date(date: Optional[datetime]) -> Optional[str]:
+    if date is None:
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    # MongoDB stores milliseconds, so hash what survives a round trip
+    return date.replace(microsecond=date.microsecond // 1000 * 1000).isoformat()
+
+
+def content_hash(record_type: str, title: Optional[str], content: str, date: Optional[datetime]) -> str:
+    """Stable fingerprint of a journal entry, used to skip duplicate imports."""
+    key = json.dumps([record_type, title or "", content, _normalize_date(date)], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = 1 << 20) -> AsyncIterator[Tuple[int, bytes]]:
+    """Split a byte stream into numbered lines without buffering the whole body."""
+    line_no = 0
+    tail = b""
+    async for chunk in chunks:
+        parts = (tail + chunk).split(b"\n")
+        tail = parts.pop()
+        for part in parts:
+            line_no += 1
+            yield line_no, part
+        if len(tail) > max_line_bytes:
+            raise ValueError(f"Line {line_no + 1} is longer than {max_line_bytes} bytes")
+    if tail.strip():
+        yield line_no + 1, tail
+
+
+class JournalImporter:
+    """Validate NDJSON rows and write them in ``insert_many`` batches.
+
+    New documents are written with ``user_id`` while duplicates are looked up
+    with ``owner_filter``, which may match several key forms during a user
+    key migration. ``schemas`` maps a record ``type`` to
+    ``(collection, pydantic model)``.
+    Rows of other known export types are counted as skipped. Duplicates are
+    detected by content hash against what the user already has, so importing
+    the same file twice is harmless.
+    """
+
+    SKIPPED_TYPES = ("devotional", "reflection")
+
+    def __init__(self, db, user_id, owner_filter: dict, schemas: Dict[str, tuple], batch_size: int = 500, max_errors: int = 100):
+        self.db = db
+        self.user_id = user_id
+        self.owner_filter = owner_filter
+        self.schemas = schemas
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+        self._pending: Dict[str, List[dict]] = {}
+
+    def _error(self, line_no: Optional[int], message: str):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no, "error": message})
+
+    async def run(self, chunks: AsyncIterator[bytes]):
+        try:
+            async for line_no, line in iter_lines(chunks):
+                if line.strip():
+                    await self._add(line_no, line)
+        except ValueError as e:
+            self._error(None, str(e))
+        for collection_name in list(self._pending):
+            await self._flush(collection_name)
+
+    async def _add(self, line_no: int, line: bytes):
+        try:
+            row = json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            self._error(line_no, f"Invalid JSON: {str(e)}")
+            return
+        if not isinstance(row, dict):
+            self._error(line_no, "Expected a JSON object")
+            return
+
+        record_type = row.pop("type", None)
+        if record_type in self.SKIPPED_TYPES:
+            self.skipped += 1
+            return
+        if record_type not in self.schemas:
+            self._error(line_no, f"Unsupported type: {record_type}")
+            return
+
+        collection_name, model = self.schemas[record_type]
+        try:
+            entry = model.model_validate(row)
+        except ValidationError as e:
+            first = e.errors()[0]
+            field = ".".join(str(part) for part in first["loc"])
+            self._error(line_no, f"{field}: {first['msg']}" if field else first["msg"])
+            return
+
+        document = entry.model_dump()
+        document["content_hash"] = content_hash(record_type, document.get("title"), document["content"], document.get("date"))
+        document["date"] = document.get("date") or datetime.utcnow()
+        document["user_id"] = self.user_id
+        document["created_at"] = datetime.utcnow()
+
+        pending = self._pending.setdefault(collection_name, [])
+        pending.append(document)
+        if len(pending) >= self.batch_size:
+            await self._flush(collection_name)
+
+    async def _flush(self, collection_name: str):
+        batch = self._pending.pop(collection_name, [])
+        if not batch:
+            return
+        collection = self.db[collection_name]
+        hashes = list({d["content_hash"] for d in batch})
+        known = set()
+        async for existing in collection.find({**self.owner_filter, "content_hash": {"$in": hashes}}, {"content_hash": 1}):
+            known.add(existing["content_hash"])
+
+        documents = []
+        for document in batch:
+            if document["content_hash"] in known:
+                self.duplicates += 1
+                continue
+            known.add(document["content_hash"])
+            documents.append(document)
+        if documents:
+            await collection.insert_many(documents, ordered=False)
+            self.imported += len(documents)
+
+    def report(self) -> dict:
+        return {
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
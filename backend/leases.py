@@ -0,0 +1,24 @@
+"""Named leases in MongoDB so only one worker runs a given background job."""
+
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+
+async def try_acquire_lease(db, name: str, owner: str, ttl_seconds: float) -> bool:
+    """Take or renew the lease ``name`` for ``owner``; False if someone else holds it."""
+    now = datetime.utcnow()
+    try:
+        await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists, is live and belongs to another worker
+        return False
+    return True
+
+
+async def release_lease(db, name: str, owner: str):
+    await db.leases.delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,175 @@
+"""Content-addressed cache of LLM responses.
+
+Entries are keyed by a hash of provider, model, system message and prompt.
+A local SQLite file answers most lookups without a network round trip and is
+bounded by total size (least recently used answers are evicted first); an
+optional Mongo tier shares answers between workers and hosts and expires them
+through a TTL index.
+
+Each key holds up to ``variants`` answers. Until that many have been stored
+``get`` reports a miss so the caller generates (and ``put``s) another one;
+after that, lookups rotate through the stored answers, least recently served
+first.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, hash)
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+"""
+
+
+def cache_key(provider: str, model: str, system_message: str, prompt: str) -> str:
+    return hashlib.sha256(
+        json.dumps([provider, model, system_message, prompt], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _hash(response: str) -> str:
+    return hashlib.sha1(response.encode("utf-8")).hexdigest()
+
+
+class LocalResponseStore:
+    """SQLite store; every method blocks, so callers run it in a thread."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def variants(self, key: str) -> List[Tuple[str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT hash, response FROM responses WHERE key = ? AND expires_at > ? ORDER BY last_used",
+                (key, time.time())
+            ).fetchall()
+
+    def touch(self, key: str, response_hash: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ? AND hash = ?",
+                (time.time(), key, response_hash)
+            )
+
+    def put(self, key: str, response: str, ttl: float, max_variants: int):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, _hash(response), response, size, now + ttl, now)
+            )
+            # Keep the newest variants of this key
+            self._conn.execute(
+                "DELETE FROM responses WHERE key = ? AND hash NOT IN "
+                "(SELECT hash FROM responses WHERE key = ? ORDER BY expires_at DESC LIMIT ?)",
+                (key, key, max_variants)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, response_hash, size in self._conn.execute(
+            "SELECT key, hash, size FROM responses ORDER BY last_used"
+        ):
+            victims.append((key, response_hash))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ? AND hash = ?", victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str, db=None, ttl: float = 7 * 86400, max_bytes: int = 64 << 20, variants: int = 1):
+        self.local = LocalResponseStore(path, max_bytes)
+        self.db = db
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        if self.db is not None:
+            await self.db.llm_cache.create_index("expires_at", expireAfterSeconds=0)
+
+    async def _remote_variants(self, key: str) -> List[str]:
+        if self.db is None:
+            return []
+        document = await self.db.llm_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        return [v["response"] for v in document["variants"]] if document else []
+
+    async def get(self, key: str) -> Optional[str]:
+        variants = await asyncio.to_thread(self.local.variants, key)
+        if len(variants) < self.variants:
+            # Another worker may already have generated the missing variants
+            known = {response_hash for response_hash, _ in variants}
+            for response in await self._remote_variants(key):
+                if _hash(response) not in known:
+                    await asyncio.to_thread(self.local.put, key, response, self.ttl, self.variants)
+            variants = await asyncio.to_thread(self.local.variants, key)
+        if len(variants) < self.variants:
+            self.misses += 1
+            return None
+        response_hash, response = variants[0]
+        await asyncio.to_thread(self.local.touch, key, response_hash)
+        self.hits += 1
+        return response
+
+    async def put(self, key: str, response: str):
+        await asyncio.to_thread(self.local.put, key, response, self.ttl, self.variants)
+        if self.db is None:
+            return
+        response_hash = _hash(response)
+        try:
+            await self.db.llm_cache.update_one(
+                {"_id": key, "variants.hash": {"$ne": response_hash}},
+                {
+                    "$push": {"variants": {"$each": [{"hash": response_hash, "response": response}], "$slice": -self.variants}},
+                    "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)},
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The key exists and already holds this response
+            pass
+
+    def stats(self) -> dict:
+        return dict(self.local.stats(), hits=self.hits, misses=self.misses, variants=self.variants)
+
+    def close(self):
+        self.local.close()
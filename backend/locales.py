@@ -0,0 +1,221 @@
+"""Locale tables for devotional generation.
+
+Each locale has its own system message, prompt template, response markers
+and fallback devotional. The prompt asks for the sections under the same
+markers the parser looks for, so a language is added by adding a table
+here; ``parse_devotional`` is shared.
+
+The prompt depends only on the locale and the theme (never on the user), so
+generated answers are cached and reused per locale: a new language costs
+LLM calls per locale, not per user.
+"""
+
+from typing import Dict, Optional, Tuple
+
+DEFAULT_LOCALE = "pt"
+
+LOCALES: Dict[str, dict] = {
+    "pt": {
+        "system_message": "Você é um assistente espiritual que cria devocionais cristãos inspiradores em português.",
+        "prompt": """Crie um devocional cristão completo em português com os seguintes elementos:
+
+1. TÍTULO: Um título inspirador e curto
+2. CONTEÚDO: Um texto devocional de 200-300 palavras que seja edificante, reflexivo e prático
+{verse_item}
+4. MÚSICAS: Sugira 3 músicas gospel (2 brasileiras e 1 internacional) relacionadas ao tema
+
+{theme_line}
+
+Formato da resposta:
+TÍTULO: [título aqui]
+CONTEÚDO: [conteúdo aqui]
+{verse_format}REFERÊNCIA: [Livro Capítulo:Versículo]
+MÚSICA_1: [Nome - Artista - País]
+MÚSICA_2: [Nome - Artista - País]
+MÚSICA_3: [Nome - Artista - País]""",
+        "verse_item": "3. VERSÍCULO: Um versículo bíblico relevante (inclua referência completa - livro, capítulo e versículo)",
+        "reference_item": "3. REFERÊNCIA: A referência de um versículo bíblico relevante (livro, capítulo e versículo)",
+        "verse_format": "VERSÍCULO: [versículo completo aqui]\n",
+        "theme_line": "Tema sugerido: {theme}",
+        "no_theme_line": "Escolha um tema espiritual relevante para hoje.",
+        "markers": {
+            "title": "TÍTULO:",
+            "content": "CONTEÚDO:",
+            "verse": "VERSÍCULO:",
+            "reference": "REFERÊNCIA:",
+            "music": "MÚSICA_",
+        },
+        "unknown_artist": "Desconhecido",
+        "default_country": "Brasil",
+        "fallback": {
+            "title": "A Paz de Deus",
+            "content": "A paz que vem de Deus é diferente de qualquer paz que o mundo pode oferecer. É uma paz que permanece mesmo em meio às tempestades da vida. Quando entregamos nossas preocupações a Deus em oração, Ele promete guardar nossos corações e mentes. Hoje, escolha confiar em Deus com cada detalhe da sua vida.",
+            "verse": "E a paz de Deus, que excede todo o entendimento, guardará o coração e a mente de vocês em Cristo Jesus.",
+            "verse_reference": "Filipenses 4:7",
+            "music_suggestions": [
+                {"name": "A Paz do Céu", "artist": "Anderson Freire", "country": "Brasil"},
+                {"name": "Deus Cuida de Mim", "artist": "Kleber Lucas", "country": "Brasil"},
+                {"name": "Peace", "artist": "Hillsong Worship", "country": "Internacional"},
+            ],
+        },
+    },
+    "es": {
+        "system_message": "Eres un asistente espiritual que crea devocionales cristianos inspiradores en español.",
+        "prompt": """Crea un devocional cristiano completo en español con los siguientes elementos:
+
+1. TÍTULO: Un título inspirador y corto
+2. CONTENIDO: Un texto devocional de 200-300 palabras que sea edificante, reflexivo y práctico
+{verse_item}
+4. CANCIONES: Sugiere 3 canciones cristianas (2 en español y 1 internacional) relacionadas con el tema
+
+{theme_line}
+
+Formato de la respuesta:
+TÍTULO: [título aquí]
+CONTENIDO: [contenido aquí]
+{verse_format}REFERENCIA: [Libro Capítulo:Versículo]
+CANCIÓN_1: [Nombre - Artista - País]
+CANCIÓN_2: [Nombre - Artista - País]
+CANCIÓN_3: [Nombre - Artista - País]""",
+        "verse_item": "3. VERSÍCULO: Un versículo bíblico relevante (incluye la referencia completa - libro, capítulo y versículo)",
+        "reference_item": "3. REFERENCIA: La referencia de un versículo bíblico relevante (libro, capítulo y versículo)",
+        "verse_format": "VERSÍCULO: [versículo completo aquí]\n",
+        "theme_line": "Tema sugerido: {theme}",
+        "no_theme_line": "Elige un tema espiritual relevante para hoy.",
+        "markers": {
+            "title": "TÍTULO:",
+            "content": "CONTENIDO:",
+            "verse": "VERSÍCULO:",
+            "reference": "REFERENCIA:",
+            "music": "CANCIÓN_",
+        },
+        "unknown_artist": "Desconocido",
+        "default_country": "Internacional",
+        "fallback": {
+            "title": "La Paz de Dios",
+            "content": "La paz que viene de Dios es diferente de cualquier paz que el mundo puede ofrecer. Es una paz que permanece aun en medio de las tormentas de la vida. Cuando entregamos nuestras preocupaciones a Dios en oración, Él promete guardar nuestros corazones y nuestras mentes. Hoy, elige confiar en Dios en cada detalle de tu vida.",
+            "verse": "Y la paz de Dios, que sobrepasa todo entendimiento, guardará vuestros corazones y vuestros pensamientos en Cristo Jesús.",
+            "verse_reference": "Filipenses 4:7",
+            "music_suggestions": [
+                {"name": "Renuévame", "artist": "Marcos Witt", "country": "México"},
+                {"name": "Sumérgeme", "artist": "Jesús Adrián Romero", "country": "México"},
+                {"name": "Peace", "artist": "Hillsong Worship", "country": "Internacional"},
+            ],
+        },
+    },
+    "en": {
+        "system_message": "You are a spiritual assistant who writes inspiring Christian devotionals in English.",
+        "prompt": """Write a complete Christian devotional in English with the following elements:
+
+1. TITLE: A short, inspiring title
+2. CONTENT: A devotional text of 200-300 words that is uplifting, reflective and practical
+{verse_item}
+4. SONGS: Suggest 3 worship songs related to the theme
+
+{theme_line}
+
+Response format:
+TITLE: [title here]
+CONTENT: [content here]
+{verse_format}REFERENCE: [Book Chapter:Verse]
+SONG_1: [Name - Artist - Country]
+SONG_2: [Name - Artist - Country]
+SONG_3: [Name - Artist - Country]""",
+        "verse_item": "3. VERSE: A relevant Bible verse (include the full reference - book, chapter and verse)",
+        "reference_item": "3. REFERENCE: The reference of a relevant Bible verse (book, chapter and verse)",
+        "verse_format": "VERSE: [full verse here]\n",
+        "theme_line": "Suggested theme: {theme}",
+        "no_theme_line": "Choose a spiritual theme relevant for today.",
+        "markers": {
+            "title": "TITLE:",
+            "content": "CONTENT:",
+            "verse": "VERSE:",
+            "reference": "REFERENCE:",
+            "music": "SONG_",
+        },
+        "unknown_artist": "Unknown",
+        "default_country": "International",
+        "fallback": {
+            "title": "The Peace of God",
+            "content": "The peace that comes from God is unlike any peace the world can offer. It is a peace that remains even in the middle of life's storms. When we bring our worries to God in prayer, He promises to guard our hearts and minds. Today, choose to trust God with every detail of your life.",
+            "verse": "And the peace of God, which transcends all understanding, will guard your hearts and your minds in Christ Jesus.",
+            "verse_reference": "Philippians 4:7",
+            "music_suggestions": [
+                {"name": "It Is Well", "artist": "Bethel Music", "country": "USA"},
+                {"name": "Goodness of God", "artist": "CeCe Winans", "country": "USA"},
+                {"name": "Peace", "artist": "Hillsong Worship", "country": "Australia"},
+            ],
+        },
+    },
+}
+
+
+def normalize_locale(value: Optional[str]) -> Optional[str]:
+    """Supported locale for values such as "es", "pt-BR" or "en_US"; None if unsupported."""
+    if not value:
+        return None
+    language = value.strip().replace("_", "-").split("-")[0].lower()
+    return language if language in LOCALES else None
+
+
+def build_prompt(locale: str, theme: Optional[str] = None, reference_only: bool = False) -> Tuple[str, str]:
+    """System message and prompt; with ``reference_only`` the verse text is not requested."""
+    table = LOCALES[locale]
+    prompt = table["prompt"].format(
+        verse_item=table["reference_item"] if reference_only else table["verse_item"],
+        verse_format="" if reference_only else table["verse_format"],
+        theme_line=table["theme_line"].format(theme=theme) if theme else table["no_theme_line"],
+    )
+    return table["system_message"], prompt
+
+
+def parse_devotional(response: str, locale: str) -> dict:
+    """Split an answer in the locale's response format into devotional fields."""
+    table = LOCALES[locale]
+    markers = table["markers"]
+    parsed = {
+        "title": "",
+        "content": "",
+        "verse": "",
+        "verse_reference": "",
+        "music_suggestions": []
+    }
+    current_section = None
+    content_lines = []
+
+    for line in response.split("\n"):
+        line = line.strip()
+        if line.startswith(markers["title"]):
+            parsed["title"] = line[len(markers["title"]):].strip()
+        elif line.startswith(markers["content"]):
+            current_section = "content"
+            content_text = line[len(markers["content"]):].strip()
+            if content_text:
+                content_lines.append(content_text)
+        elif line.startswith(markers["verse"]):
+            current_section = "verse"
+            parsed["verse"] = line[len(markers["verse"]):].strip()
+        elif line.startswith(markers["reference"]):
+            current_section = None
+            parsed["verse_reference"] = line[len(markers["reference"]):].strip()
+        elif line.startswith(markers["music"]):
+            current_section = None
+            music_info = line.split(":", 1)[1].strip() if ":" in line else ""
+            parts = [p.strip() for p in music_info.split("-")]
+            if len(parts) >= 2:
+                parsed["music_suggestions"].append({
+                    "name": parts[0],
+                    "artist": parts[1] or table["unknown_artist"],
+                    "country": parts[2] if len(parts) > 2 else table["default_country"]
+                })
+        elif current_section == "content" and line:
+            content_lines.append(line)
+
+    parsed["content"] = " ".join(content_lines)
+    return parsed
+
+
+def fallback_devotional(locale: str) -> dict:
+    """Fixed devotional served when generation fails, marked with ``fallback``."""
+    fallback = LOCALES[locale]["fallback"]
+    return dict(fallback, music_suggestions=[dict(song) for song in fallback["music_suggestions"]], fallback=True)
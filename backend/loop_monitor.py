@@ -0,0 +1,99 @@
+"""Event loop lag sampling and blocking-call detection.
+
+``LoopLagMonitor`` sleeps for a fixed interval and records how late it wakes
+up: any lateness is time during which some callback held the loop.
+
+``BlockingDetector`` (debug mode) keeps a heartbeat on the loop and a
+watchdog thread that, when the heartbeat is older than ``threshold``,
+captures the loop thread's stack while it is still blocked. Each stall is
+reported once, with its total duration filled in when the loop recovers.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from metrics import MetricsRegistry
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class LoopLagMonitor:
+    def __init__(self, registry: MetricsRegistry, interval: float = 0.5):
+        self.interval = interval
+        self.lag = registry.histogram("event_loop_lag_seconds", "Delay of the loop waking a sleeping task", LAG_BUCKETS)
+        self.last_lag = registry.gauge("event_loop_lag_last_seconds", "Most recent loop lag sample")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.lag.observe(lag)
+            self.last_lag.set(lag)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class BlockingDetector:
+    def __init__(self, registry: MetricsRegistry, threshold: float = 0.1, max_reports: int = 50):
+        self.threshold = threshold
+        self.reports = deque(maxlen=max_reports)
+        self.blocked = registry.counter("event_loop_blocked_total", "Callbacks that held the loop past the threshold")
+        self._beat = time.monotonic()
+        self._stopped = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, args=(loop_thread,), name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self, loop_thread: int):
+        current = None
+        while not self._stopped.wait(self.threshold / 4):
+            beat = self._beat
+            blocked_for = time.monotonic() - beat
+            if blocked_for < self.threshold:
+                current = None
+                continue
+            if current is not None and current["beat"] == beat:
+                current["report"]["blocked_ms"] = round(blocked_for * 1000, 1)
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            report = {
+                "at": datetime.utcnow().isoformat(),
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "stack": traceback.format_stack(frame) if frame is not None else [],
+            }
+            current = {"beat": beat, "report": report}
+            self.reports.append(report)
+            self.blocked.inc()
+
+    def recent(self) -> List[dict]:
+        return list(reversed(self.reports))
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1,138 @@
+"""In-process metrics registry.
+
+Counters, gauges and histograms are plain objects updated from the event
+loop (or under the GIL from helper threads); ``snapshot`` returns them as a
+dict and ``render_prometheus`` in the Prometheus text format. Components that
+already keep their own statistics register a collector returning a dict of
+numbers instead of mirroring every value.
+"""
+
+import bisect
+from typing import Callable, Dict, List, Sequence
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self._cumulative())),
+        }
+
+    def _cumulative(self) -> List[int]:
+        total, cumulative = 0, []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+def _flatten(prefix: str, data: dict, out: Dict[str, float]):
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _flatten(f"{prefix}_{key}", value, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}_{key}"] = value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def _get_or_create(self, cls, name: str, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {type(metric).__name__}")
+        return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict]):
+        """Export the numeric values of ``collect()`` as gauges named ``<prefix>_<key>``.
+
+        Nested dicts are flattened (``<prefix>_<key>_<subkey>``).
+        """
+        self._collectors[prefix] = collect
+
+    def _collected(self) -> Dict[str, float]:
+        values = {}
+        for prefix, collect in self._collectors.items():
+            _flatten(prefix, collect(), values)
+        return values
+
+    def snapshot(self) -> dict:
+        data = {}
+        for name, metric in self._metrics.items():
+            data[name] = metric.snapshot() if isinstance(metric, Histogram) else metric.value
+        data.update(self._collected())
+        return data
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, metric in self._metrics.items():
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {name} histogram")
+                for bound, count in zip([str(b) for b in metric.buckets] + ["+Inf"], metric._cumulative()):
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+                lines.append(f"{name}_sum {metric.sum}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'gauge'}")
+                lines.append(f"{name} {metric.value}")
+        for name, value in self._collected().items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
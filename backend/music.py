@@ -0,0 +1,164 @@
+"""Deduplicated catalog of music suggestions.
+
+Devotionals reference songs by id (``music_ids``) instead of embedding
+``{name, artist, country}`` dicts. Songs are deduplicated on a normalized
+``name|artist`` key so spelling variants from the LLM collapse into one
+entry, and each song keeps a ``count`` of the devotionals suggesting it, from
+which the popular list is served. Fallback devotionals (served when generation
+fails) always suggest the same songs, so they are cataloged without counting.
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+COUNTRY_ALIASES = {
+    "brasil": "Brasil",
+    "brazil": "Brasil",
+    "br": "Brasil",
+    "brasileira": "Brasil",
+    "internacional": "Internacional",
+    "international": "Internacional",
+}
+
+
+def normalize(text: str) -> str:
+    folded = "".join(
+        c for c in unicodedata.normalize("NFD", (text or "").lower()) if unicodedata.category(c) != "Mn"
+    )
+    folded = re.sub(r"\(.*?\)|\bfeat\.?.*$|\bft\.?.*$", " ", folded)
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", folded).split())
+
+
+def song_key(name: str, artist: str) -> Optional[str]:
+    name_key, artist_key = normalize(name), normalize(artist)
+    if not name_key:
+        return None
+    return f"{name_key}|{artist_key}"
+
+
+def normalize_country(country: str) -> str:
+    country = (country or "").strip()
+    return COUNTRY_ALIASES.get(normalize(country), country or "Brasil")
+
+
+def public_song(song: dict) -> dict:
+    return {"name": song["name"], "artist": song["artist"], "country": song["country"]}
+
+
+class MusicCatalog:
+    def __init__(self, db, cache_size: int = 50000):
+        self.db = db
+        self._songs = LRUCache(cache_size)
+        self._popular: List[dict] = []
+
+    async def ensure_indexes(self):
+        await self.db.songs.create_index("key", unique=True)
+        await self.db.songs.create_index([("count", DESCENDING)])
+
+    async def _upsert(self, key: str, suggestion: dict, counted: bool = True) -> dict:
+        update = {
+            "$setOnInsert": {
+                "name": " ".join(suggestion.get("name", "").split()),
+                "artist": " ".join(suggestion.get("artist", "").split()) or "Desconhecido",
+                "country": normalize_country(suggestion.get("country")),
+            },
+            "$inc": {"count": 1 if counted else 0},
+        }
+        for attempt in range(2):
+            try:
+                return await self.db.songs.find_one_and_update(
+                    {"key": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Lost an upsert race with another request; the retry matches the winner
+                if attempt:
+                    raise
+
+    async def register(self, suggestions: Iterable[dict], counted: bool = True) -> List:
+        """Catalog parsed suggestions (counting one more use of each, once per call) and return their ids."""
+        ids = []
+        keys = set()
+        for suggestion in suggestions:
+            key = song_key(suggestion.get("name"), suggestion.get("artist"))
+            if key is None or key in keys:
+                continue
+            keys.add(key)
+            song = await self._upsert(key, suggestion, counted)
+            if song["_id"] not in ids:
+                self._songs.set(song["_id"], public_song(song))
+                ids.append(song["_id"])
+        return ids
+
+    async def resolve(self, ids: Iterable) -> List[dict]:
+        ids = list(ids)
+        songs: Dict = {}
+        missing = []
+        for song_id in ids:
+            song = self._songs.get(song_id)
+            if song is None:
+                missing.append(song_id)
+            else:
+                songs[song_id] = song
+        if missing:
+            async for song in self.db.songs.find({"_id": {"$in": missing}}):
+                songs[song["_id"]] = public_song(song)
+                self._songs.set(song["_id"], songs[song["_id"]])
+        return [songs[song_id] for song_id in ids if song_id in songs]
+
+    async def attach(self, devotionals: List[dict]):
+        """Fill ``music_suggestions`` on devotionals that reference songs by id."""
+        referenced = list({song_id for d in devotionals for song_id in d.get("music_ids", [])})
+        songs = {}
+        if referenced:
+            # A devotional whose answer had no songs has no ids, but still gets an empty list
+            await self.resolve(referenced)
+            songs = {song_id: self._songs.get(song_id) for song_id in referenced}
+        for d in devotionals:
+            if "music_ids" in d:
+                d["music_suggestions"] = [songs[i] for i in d["music_ids"] if songs.get(i) is not None]
+
+    async def refresh_popular(self, limit: int = 50):
+        songs = await self.db.songs.find({}, {"key": 0}).sort("count", DESCENDING).limit(limit).to_list(limit)
+        self._popular = [dict(public_song(s), id=str(s["_id"]), count=s["count"]) for s in songs]
+
+    def popular(self, limit: int = 20) -> List[dict]:
+        return self._popular[:limit]
+
+    async def backfill(self, batch_size: int = 500) -> int:
+        """Move embedded ``music_suggestions`` of older devotionals into the catalog.
+
+        Walks the collection once in ``_id`` order; a devotional that fails is
+        logged and left for the next run.
+        """
+        migrated = 0
+        last_id = None
+        while True:
+            query = {"music_suggestions": {"$exists": True}, "music_ids": {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            batch = await self.db.devotionals.find(
+                query, {"music_suggestions": 1}
+            ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                return migrated
+            for d in batch:
+                try:
+                    ids = await self.register(d.get("music_suggestions") or [])
+                    await self.db.devotionals.update_one(
+                        {"_id": d["_id"]},
+                        {"$set": {"music_ids": ids}, "$unset": {"music_suggestions": ""}}
+                    )
+                    migrated += 1
+                except Exception as e:
+                    logger.error(f"Music backfill skipped devotional {d['_id']}: {str(e)}")
+            last_id = batch[-1]["_id"]
+            logger.info(f"Music backfill: {migrated} devotionals migrated")
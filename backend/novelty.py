@@ -0,0 +1,107 @@
+"""Per-user novelty tracking so reused devotionals are not shown twice.
+
+Each user has a small Bloom filter over the fingerprints of every devotional
+they have been given (exact repeats) plus the MinHash signatures of the most
+recent ones (near-duplicates: same text lightly reworded, or the same verse
+with a very similar reflection). Both live in the ``user_novelty``
+collection, keyed by the user's id, so the cached user document stays small.
+"""
+
+import hashlib
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from bson.binary import Binary
+
+from similarity import text_fingerprint, tokenize
+
+BLOOM_BITS = 8192
+BLOOM_HASHES = 5
+# ~1% false positives up to this many items; the filter is reset beyond it
+BLOOM_CAPACITY = 850
+
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+RECENT_SIGNATURES = 30
+
+_PRIME = (1 << 31) - 1
+# Fixed seed: signatures must be comparable across workers and restarts
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+class BloomFilter:
+    def __init__(self, data: Optional[bytes] = None, count: int = 0):
+        self.bits = bytearray(data) if data else bytearray(BLOOM_BITS // 8)
+        self.count = count
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+    def add(self, item: str):
+        if self.count >= BLOOM_CAPACITY:
+            self.bits = bytearray(BLOOM_BITS // 8)
+            self.count = 0
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+def minhash(text: str) -> np.ndarray:
+    tokens = tokenize(text)
+    if not tokens:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    values = np.array([zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles], dtype=np.uint64)
+    hashed = (np.outer(values, _A) + _B) % _PRIME
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def novelty_text(devotional: dict) -> str:
+    return f"{devotional.get('content', '')} {devotional.get('verse_reference', '')}"
+
+
+class UserNovelty:
+    """What one user has already seen, loaded from and saved to ``user_novelty``."""
+
+    def __init__(self, user_id, document: Optional[dict] = None):
+        document = document or {}
+        self.user_id = user_id
+        self.bloom = BloomFilter(document.get("bloom"), document.get("count", 0))
+        self.recent: List[np.ndarray] = [np.frombuffer(s, dtype=np.uint32) for s in document.get("recent", [])]
+
+    @classmethod
+    async def load(cls, db, user_id) -> "UserNovelty":
+        return cls(user_id, await db.user_novelty.find_one({"_id": user_id}))
+
+    def is_novel(self, devotional: dict, near_duplicate_threshold: float) -> bool:
+        if text_fingerprint(novelty_text(devotional)) in self.bloom:
+            return False
+        signature = minhash(novelty_text(devotional))
+        return all(estimated_jaccard(signature, seen) < near_duplicate_threshold for seen in self.recent)
+
+    async def record(self, db, devotional: dict):
+        text = novelty_text(devotional)
+        self.bloom.add(text_fingerprint(text))
+        self.recent = (self.recent + [minhash(text)])[-RECENT_SIGNATURES:]
+        await db.user_novelty.update_one(
+            {"_id": self.user_id},
+            {"$set": {
+                "bloom": Binary(bytes(self.bloom.bits)),
+                "count": self.bloom.count,
+                "recent": [Binary(s.tobytes()) for s in self.recent],
+            }},
+            upsert=True
+        )
@@ -0,0 +1,169 @@
+"""Opt-in sampling profiler for live requests.
+
+A profiled request starts a sampler thread that snapshots the event loop
+thread's stack every few milliseconds (``sys._current_frames``), so the
+request itself runs unmodified and the overhead is one short stack walk per
+interval. Samples are written in the folded-stack format read by
+flamegraph.pl, speedscope and inferno::
+
+    main (uvicorn/main.py:1);run (asyncio/runners.py:42);... 17
+
+Because every request shares the event loop, a profile shows everything the
+worker did while the profiled request was in flight, not just that request.
+"""
+
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+PROFILE_SUFFIX = ".folded"
+_UNSAFE = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack from a daemon thread until stopped."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop and return the samples; blocks for up to one interval, so call it off the event loop."""
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self.samples
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+class ProfileStore:
+    """Folded-stack files in one directory, keeping only the newest ``max_files``."""
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def new_name(self, method: str, path: str) -> str:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        slug = _UNSAFE.sub("_", path).strip("_")[:60] or "root"
+        return f"{stamp}-{method.lower()}-{slug}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+    def write(self, name: str, samples: Counter):
+        lines = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        tmp = self.directory / (name + ".tmp")
+        tmp.write_text(lines, encoding="utf-8")
+        os.replace(tmp, self.directory / name)
+        self._rotate()
+
+    def _rotate(self):
+        with self._lock:
+            files = sorted(self.directory.glob("*" + PROFILE_SUFFIX), key=lambda p: p.stat().st_mtime)
+            for old in files[:max(0, len(files) - self.max_files)]:
+                old.unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        profiles = []
+        for path in self.directory.glob("*" + PROFILE_SUFFIX):
+            stat = path.stat()
+            profiles.append({
+                "name": path.name,
+                "size": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+        return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+    def path(self, name: str) -> Optional[Path]:
+        """Path of a stored profile; None for unknown names or names escaping the directory."""
+        if "/" in name or "\\" in name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+class ProfilerMiddleware:
+    """Profile a random ``sample_rate`` of requests, requests under ``routes``,
+    and requests sending ``X-Profile: <header_token>``.
+
+    Profiled responses carry an ``X-Profile-Id`` header naming the stored
+    profile. At most ``max_concurrent`` requests are profiled at once.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = 0.0, routes: Sequence[str] = (),
+                 header_token: Optional[str] = None, interval: float = 0.005, max_concurrent: int = 2):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.routes = tuple(r for r in routes if r)
+        self.header_token = header_token
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    def _wanted(self, scope) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        if self.routes and scope["path"].startswith(self.routes):
+            return True
+        if self.header_token and Headers(scope=scope).get("x-profile") == self.header_token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = self.store.new_name(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message.setdefault("headers", []))["X-Profile-Id"] = name
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        self.active += 1
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.active -= 1
+            # Joining the sampler thread waits out its current interval
+            samples = await asyncio.to_thread(sampler.stop)
+            if samples:
+                await asyncio.to_thread(self.store.write, name, samples)
@@ -0,0 +1,174 @@
+"""Write-hot "amém" reactions on public reflections.
+
+A popular reflection can take thousands of reactions a minute, which would
+all contend on a single document if each one were an ``$inc``. Instead each
+worker aggregates them in memory and flushes every ``flush_interval``
+seconds: the reaction records go out in one ``insert_many`` and the counters
+in one ``bulk_write`` with a single ``$inc`` per reflection.
+
+Each user reacts at most once per reflection. Repeated taps are dropped in
+memory by a per-reflection set of 64-bit user digests (kept for the most
+recently reacted reflections only); the unique index on the ``reactions``
+collection is the final word, and only records that were actually inserted
+are counted, so reactions that reach other workers, or come back after a
+set was evicted, are never counted twice.
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def user_digest(user_id) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), "big")
+
+
+class ReactionAggregator:
+    def __init__(
+        self,
+        db,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        tracked_reflections: int = 1000,
+        on_flush: Optional[Callable[[List], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self.flushed = 0
+        self.duplicates = 0
+        self._seen = LRUCache(tracked_reflections)
+        self._records: List[dict] = []
+        self._queued: Counter = Counter()
+        # Inserted reactions whose counter increment has not been applied yet
+        self._increments: Counter = Counter()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.db.reactions.create_index([("reflection_id", 1), ("user_id", 1)], unique=True)
+
+    @property
+    def pending(self) -> int:
+        return sum(self._queued.values()) + sum(self._increments.values())
+
+    def known(self, reflection_id) -> bool:
+        """Whether ``reflection_id`` was reacted to recently, so it is known to exist."""
+        return self._seen.get(reflection_id) is not None
+
+    def pending_for(self, reflection_id) -> int:
+        """Reactions accepted here that are not in the stored counter yet."""
+        return self._queued[reflection_id] + self._increments[reflection_id]
+
+    async def react(self, reflection_id, user_id) -> bool:
+        """Record one reaction; False if this user's reaction was already seen here."""
+        seen: Optional[Set[int]] = self._seen.get(reflection_id)
+        if seen is None:
+            seen = set()
+            self._seen.set(reflection_id, seen)
+        digest = user_digest(user_id)
+        if digest in seen:
+            self.duplicates += 1
+            return False
+        if len(self._records) >= self.max_pending:
+            await self.flush()
+            if len(self._records) >= self.max_pending:
+                raise RuntimeError("Reaction buffer is full and could not be flushed")
+        seen.add(digest)
+        self._records.append({"reflection_id": reflection_id, "user_id": user_id, "created_at": datetime.utcnow()})
+        self._queued[reflection_id] += 1
+        return True
+
+    async def _insert(self, records: List[dict]) -> Iterable:
+        """Insert reaction records and return the reflection ids of those that were new."""
+        try:
+            await self.db.reactions.insert_many(records, ordered=False)
+            return [record["reflection_id"] for record in records]
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            failed = {err["index"] for err in errors}
+            others = [err for err in errors if err.get("code") != DUPLICATE_KEY]
+            self.duplicates += len(failed) - len(others)
+            if others:
+                logger.error(f"Reaction flush dropped {len(others)} reactions: {others[0].get('errmsg')}")
+            for err in others:
+                # Not stored, so the user may react again
+                record = records[err["index"]]
+                seen = self._seen.get(record["reflection_id"])
+                if seen is not None:
+                    seen.discard(user_digest(record["user_id"]))
+            return [record["reflection_id"] for index, record in enumerate(records) if index not in failed]
+
+    async def flush(self):
+        async with self._lock:
+            records, self._records = self._records, []
+            if records:
+                try:
+                    inserted = await self._insert(records)
+                except Exception as e:
+                    logger.error(f"Reaction flush failed, requeueing {len(records)} reactions: {str(e)}")
+                    self._records = records + self._records
+                    return
+                # Moved from queued to inserted without ever leaving pending_for
+                self._increments.update(inserted)
+                self._queued.subtract(record["reflection_id"] for record in records)
+                self._queued = +self._queued
+            if not self._increments:
+                return
+            increments = Counter(self._increments)
+            try:
+                await self.db.reflections.bulk_write(
+                    [UpdateOne({"_id": rid}, {"$inc": {"amen_count": count}}) for rid, count in increments.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                # The records are stored, so only the increments are retried
+                logger.error(f"Reaction counter flush failed for {len(increments)} reflections: {str(e)}")
+                return
+            self._increments.subtract(increments)
+            self._increments = +self._increments
+            self.flushed += sum(increments.values())
+
+        if self.on_flush is not None:
+            try:
+                await self.on_flush(list(increments))
+            except Exception as e:
+                logger.warning(f"Reaction on_flush hook failed: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self.pending:
+            logger.error(f"Reaction shutdown left {self.pending} reactions unflushed")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "duplicates": self.duplicates,
+            "tracked_reflections": len(self._seen),
+        }
@@ -0,0 +1,68 @@
+"""Per-route read preference.
+
+Routes that can tolerate slightly stale data (history lists) read through a
+database handle with their own read preference, so they can be served by
+replica-set secondaries; everything else stays on the primary. Reads that
+fill a cache should stay on the primary, or a lagging secondary's answer is
+kept for the whole TTL. Routes are configured as ``name=mode`` pairs, for
+example::
+
+    READ_PREFERENCE_ROUTES=devotionals=secondaryPreferred,gratitudes=nearest
+
+``maxStalenessSeconds`` bounds how far behind a secondary may be (MongoDB
+requires at least 90 seconds). On a standalone server every mode reads from
+the single node. To try it locally, start a three-member replica set::
+
+    for port in 27017 27018 27019; do
+        mongod --replSet rs0 --port $port --dbpath /tmp/rs0-$port --fork --logpath /tmp/rs0-$port.log
+    done
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+
+and point ``MONGO_URL`` at ``mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0``.
+"""
+
+from typing import Dict
+
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def parse_routes(setting: str) -> Dict[str, str]:
+    routes = {}
+    for pair in setting.split(","):
+        if not pair.strip():
+            continue
+        name, _, mode = pair.partition("=")
+        name, mode = name.strip(), mode.strip()
+        if mode not in MODES:
+            raise ValueError(f"Unknown read preference {mode!r} for route {name!r}")
+        routes[name] = mode
+    return routes
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode == "primary":
+        return Primary()
+    return MODES[mode](max_staleness=max_staleness)
+
+
+class ReadRouter:
+    def __init__(self, db, routes: Dict[str, str], max_staleness: int = -1):
+        self.primary = db
+        self.routes = routes
+        self._handles = {"primary": db}
+        for mode in set(routes.values()):
+            if mode not in self._handles:
+                self._handles[mode] = db.with_options(read_preference=read_preference(mode, max_staleness))
+
+    def db(self, route: str):
+        """Database handle for ``route``; routes without a setting read from the primary."""
+        return self._handles[self.routes.get(route, "primary")]
@@ -0,0 +1,103 @@
+"""Broadcast hub that pushes live events to WebSocket subscribers.
+
+Each published message is serialized once and the same text frame is queued
+for every subscriber. Queues are bounded: when a slow client falls behind the
+oldest frames are dropped, and a client that keeps overflowing (or stalls on
+a single send) is disconnected so it cannot hold memory or slow down
+everybody else.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Optional, Set
+
+from starlette.websockets import WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.overflows = 0
+
+    def offer(self, frame: str) -> bool:
+        """Queue ``frame``; returns False if this subscriber had to drop data."""
+        try:
+            self.queue.put_nowait(frame)
+            self.overflows = 0
+            return True
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(frame)
+            self.dropped += 1
+            self.overflows += 1
+            return False
+
+
+class BroadcastHub:
+    def __init__(self, queue_size: int = 32, max_overflows: int = 64, send_timeout: float = 10.0):
+        self.queue_size = queue_size
+        self.max_overflows = max_overflows
+        self.send_timeout = send_timeout
+        self.published = 0
+        self.disconnected_slow = 0
+        self._subscribers: Set[Subscriber] = set()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, message: dict):
+        frame = json.dumps(message, default=str)
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if not subscriber.offer(frame) and subscriber.overflows >= self.max_overflows:
+                # Persistently slow client: drop it and let the sender close the socket
+                self._subscribers.discard(subscriber)
+                self.disconnected_slow += 1
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+
+    async def serve(self, websocket, subscriber: Subscriber):
+        """Pump queued frames to an accepted websocket until either side stops."""
+
+        async def sender():
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    await websocket.close(code=1013)  # try again later
+                    return
+                await asyncio.wait_for(websocket.send_text(frame), self.send_timeout)
+
+        async def receiver():
+            # Clients do not send anything meaningful; reading detects disconnects
+            while True:
+                await websocket.receive_text()
+
+        tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if isinstance(exc, asyncio.TimeoutError):
+                    self.disconnected_slow += 1
+                elif exc is not None and not isinstance(exc, WebSocketDisconnect):
+                    logger.warning(f"WebSocket subscriber error: {str(exc)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+        }
@@ -0,0 +1,320 @@
+"""Daily devotional reminders.
+
+Every reminder (one per user, at a local time of day) is persisted in the
+``reminders`` collection with its next firing instant. Reminders are split
+into ``shards`` by user id; each worker holds leases on some shards and keeps
+their reminders in memory in a hierarchical timing wheel, so scheduling,
+rescheduling and cancelling are O(1) and a tick only touches the entries
+that are due.
+
+Workers announce themselves with a lease of their own, renewed on every
+sync, and hold at most an even share of the shards among the live workers
+(capped by ``max_shards``): a worker above its share releases the excess,
+so a worker that joins takes its part over within a couple of syncs.
+
+Each reminder fires twice: ``lead`` seconds early to prepare the devotional
+(the caller enqueues its generation) and on time to notify the user. The
+notification is claimed by advancing ``next_fire_at`` with a conditional
+update first, so a shard changing hands never notifies twice.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from leases import release_lease, try_acquire_lease
+
+logger = logging.getLogger(__name__)
+
+WORKER_LEASE_PREFIX = "reminder_workers:"
+
+PREPARE = "prepare"
+NOTIFY = "notify"
+# Firings missed by more than this (e.g. while no worker owned the shard) are skipped
+MAX_LATENESS = timedelta(hours=1)
+
+
+class TimingWheel:
+    """Hierarchical timing wheel keyed by item id.
+
+    Level ``i`` has ``sizes[i]`` slots, each ``prod(sizes[:i])`` ticks wide.
+    Items go to the lowest level whose span covers their delay and cascade
+    down as time advances; delays beyond the top level wait in an overflow
+    bucket that is re-examined every top-level revolution.
+    """
+
+    def __init__(self, tick: float = 1.0, sizes: Sequence[int] = (64, 64, 64), start: Optional[float] = None):
+        self.tick = tick
+        self.sizes = tuple(sizes)
+        self.granularity = [math.prod(self.sizes[:i]) for i in range(len(self.sizes))]
+        self.span = math.prod(self.sizes)
+        self.current = int((time.time() if start is None else start) // tick)
+        self.wheels: List[List[Dict[Hashable, tuple]]] = [[{} for _ in range(size)] for size in self.sizes]
+        self.overflow: Dict[Hashable, tuple] = {}
+        self._where: Dict[Hashable, Dict[Hashable, tuple]] = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, item_id):
+        return item_id in self._where
+
+    def schedule(self, item_id: Hashable, at: float, payload=None):
+        self.cancel(item_id)
+        self._place(item_id, (max(int(at // self.tick), self.current + 1), payload))
+
+    def cancel(self, item_id: Hashable) -> bool:
+        bucket = self._where.pop(item_id, None)
+        if bucket is None:
+            return False
+        del bucket[item_id]
+        return True
+
+    def _place(self, item_id, entry):
+        deadline = entry[0]
+        ticks = deadline - self.current
+        bucket = self.overflow
+        for level, size in enumerate(self.sizes):
+            if ticks < self.granularity[level] * size:
+                bucket = self.wheels[level][(deadline // self.granularity[level]) % size]
+                break
+        bucket[item_id] = entry
+        self._where[item_id] = bucket
+
+    def _cascade(self, bucket: Dict[Hashable, tuple]):
+        entries = list(bucket.items())
+        bucket.clear()
+        for item_id, entry in entries:
+            self._place(item_id, entry)
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, object]]:
+        """Move the wheel to ``now`` and return the ``(item id, payload)`` pairs that came due."""
+        target = int((time.time() if now is None else now) // self.tick)
+        due = []
+        while self.current < target:
+            self.current += 1
+            if self.current % self.span == 0:
+                self._cascade(self.overflow)
+            # Higher levels first, so their items can land in the slots cascaded next
+            for level in range(len(self.sizes) - 1, 0, -1):
+                if self.current % self.granularity[level] == 0:
+                    self._cascade(self.wheels[level][(self.current // self.granularity[level]) % self.sizes[level]])
+            bucket = self.wheels[0][self.current % self.sizes[0]]
+            for item_id, (deadline, payload) in list(bucket.items()):
+                if deadline <= self.current:
+                    del bucket[item_id]
+                    del self._where[item_id]
+                    due.append((item_id, payload))
+        return due
+
+
+def next_fire_at(local_time: str, tz_name: str, after: datetime) -> datetime:
+    """Next UTC instant (naive, like the rest of the database) at ``local_time`` in ``tz_name``."""
+    hour, minute = (int(part) for part in local_time.split(":"))
+    tz = ZoneInfo(tz_name)
+    local_now = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    candidate = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= local_now:
+        candidate = (local_now + timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def shard_of(user_id, shards: int) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=4).digest(), "big") % shards
+
+
+# ============ NOTIFIERS ============
+
+class LogNotifier:
+    """Stand-in notifier: logs and keeps the most recent messages for inspection."""
+
+    def __init__(self, keep: int = 1000):
+        self.sent = deque(maxlen=keep)
+
+    async def send(self, user_id, message: dict):
+        self.sent.append({"user_id": str(user_id), "at": datetime.utcnow().isoformat(), **message})
+        logger.info(f"Reminder for {user_id}: {message.get('title')}")
+
+
+def load_notifier(spec: str):
+    """``log`` for the stub, or ``package.module:Class`` for a notifier with ``async send(user_id, message)``."""
+    if spec == "log":
+        return LogNotifier()
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# ============ SCHEDULER ============
+
+class ReminderScheduler:
+    def __init__(self, db, worker_id: str, notifier, prepare: Callable[[dict], Awaitable[None]],
+                 shards: int = 64, max_shards: Optional[int] = None, lead: float = 300,
+                 sync_interval: float = 30, concurrency: int = 50):
+        self.db = db
+        self.worker_id = worker_id
+        self.notifier = notifier
+        self.prepare = prepare
+        self.shards = shards
+        self.max_shards = max_shards or shards
+        self.lead = lead
+        self.sync_interval = sync_interval
+        self.wheel = TimingWheel(tick=1.0)
+        self.owned: Set[int] = set()
+        self._by_shard: Dict[int, Set] = {}
+        self._last_sync: Optional[datetime] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self.notified = 0
+        self.prepared = 0
+
+    async def ensure_indexes(self):
+        await self.db.reminders.create_index([("shard", 1), ("updated_at", 1)])
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run_ticks()), asyncio.create_task(self._run_ownership())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for shard in list(self.owned):
+            await release_lease(self.db, f"reminders:{shard}", self.worker_id)
+        await release_lease(self.db, f"{WORKER_LEASE_PREFIX}{self.worker_id}", self.worker_id)
+
+    # ---- shard ownership and loading ----
+
+    async def _run_ownership(self):
+        while True:
+            try:
+                await self._rebalance()
+                await self._sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error syncing reminders: {str(e)}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def _live_workers(self, ttl: float) -> int:
+        await try_acquire_lease(self.db, f"{WORKER_LEASE_PREFIX}{self.worker_id}", self.worker_id, ttl)
+        return await self.db.leases.count_documents({
+            "_id": {"$regex": f"^{WORKER_LEASE_PREFIX}"},
+            "expires_at": {"$gt": datetime.utcnow()},
+        })
+
+    async def _rebalance(self):
+        ttl = self.sync_interval * 3
+        workers = max(1, await self._live_workers(ttl))
+        limit = min(self.max_shards, math.ceil(self.shards / workers))
+        # Give up shards beyond this worker's share, for the workers that joined to take
+        for shard in sorted(self.owned)[limit:]:
+            await release_lease(self.db, f"reminders:{shard}", self.worker_id)
+            self._drop_shard(shard)
+            logger.info(f"Reminder shard {shard} released to other workers ({workers} live)")
+        for shard in range(self.shards):
+            if shard not in self.owned and len(self.owned) >= limit:
+                continue
+            held = await try_acquire_lease(self.db, f"reminders:{shard}", self.worker_id, ttl)
+            if held and shard not in self.owned:
+                self.owned.add(shard)
+                await self._load_shard(shard)
+            elif not held and shard in self.owned:
+                self._drop_shard(shard)
+
+    async def _load_shard(self, shard: int):
+        ids = self._by_shard.setdefault(shard, set())
+        async for reminder in self.db.reminders.find({"shard": shard, "enabled": True}).batch_size(5000):
+            self._schedule(reminder)
+            ids.add(reminder["_id"])
+        logger.info(f"Reminder shard {shard} loaded with {len(ids)} reminders")
+
+    def _drop_shard(self, shard: int):
+        self.owned.discard(shard)
+        for user_id in self._by_shard.pop(shard, set()):
+            self.wheel.cancel((user_id, PREPARE))
+            self.wheel.cancel((user_id, NOTIFY))
+
+    async def _sync(self):
+        """Pick up reminders changed by any worker since the last sync."""
+        started = datetime.utcnow()
+        if self._last_sync is not None and self.owned:
+            query = {"shard": {"$in": list(self.owned)}, "updated_at": {"$gte": self._last_sync}}
+            async for reminder in self.db.reminders.find(query):
+                self.apply(reminder)
+        self._last_sync = started - timedelta(seconds=1)
+
+    def apply(self, reminder: dict):
+        """(Re)schedule or cancel one reminder if its shard is owned here."""
+        if reminder["shard"] not in self.owned:
+            return
+        ids = self._by_shard.setdefault(reminder["shard"], set())
+        if reminder.get("enabled"):
+            self._schedule(reminder)
+            ids.add(reminder["_id"])
+        else:
+            self.wheel.cancel((reminder["_id"], PREPARE))
+            self.wheel.cancel((reminder["_id"], NOTIFY))
+            ids.discard(reminder["_id"])
+
+    def _schedule(self, reminder: dict):
+        fire_at = reminder["next_fire_at"].replace(tzinfo=timezone.utc).timestamp()
+        payload = {"next_fire_at": reminder["next_fire_at"]}
+        if fire_at - self.lead > time.time():
+            self.wheel.schedule((reminder["_id"], PREPARE), fire_at - self.lead, payload)
+        self.wheel.schedule((reminder["_id"], NOTIFY), fire_at, payload)
+
+    # ---- firing ----
+
+    async def _run_ticks(self):
+        while True:
+            for (user_id, kind), payload in self.wheel.advance():
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._fire(user_id, kind, payload))
+                task.add_done_callback(lambda _: self._semaphore.release())
+            await asyncio.sleep(self.wheel.tick)
+
+    async def _fire(self, user_id, kind: str, payload: dict):
+        try:
+            if kind == PREPARE:
+                await self.prepare({"user_id": user_id, "fire_at": payload["next_fire_at"]})
+                self.prepared += 1
+            else:
+                await self._notify(user_id, payload["next_fire_at"])
+        except Exception as e:
+            logger.error(f"Reminder {kind} for {user_id} failed: {str(e)}")
+
+    async def _notify(self, user_id, fired_at: datetime):
+        reminder = await self.db.reminders.find_one({"_id": user_id})
+        if reminder is None or not reminder.get("enabled"):
+            return
+        following = next_fire_at(reminder["time"], reminder["timezone"], max(fired_at, datetime.utcnow()))
+        # Claim this firing: only the worker that advances next_fire_at sends it
+        claimed = await self.db.reminders.update_one(
+            {"_id": user_id, "next_fire_at": fired_at},
+            {"$set": {"next_fire_at": following, "last_fired_at": fired_at, "updated_at": datetime.utcnow()}}
+        )
+        if claimed.modified_count == 0:
+            return
+        self._schedule(dict(reminder, next_fire_at=following))
+        if datetime.utcnow() - fired_at > MAX_LATENESS:
+            return
+        await self.notifier.send(user_id, {
+            "type": "daily_devotional",
+            "title": "Seu devocional de hoje está pronto",
+            "date": fired_at.date().isoformat(),
+        })
+        self.notified += 1
+
+    def stats(self) -> dict:
+        return {
+            "owned_shards": len(self.owned),
+            "scheduled": len(self.wheel),
+            "prepared": self.prepared,
+            "notified": self.notified,
+        }
@@ -1,32 +1,294 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, WebSocket, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo import ReturnDocument
 import os
+import json
+import socket
+import time
 import logging
 from pathlib import Path
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
+from zoneinfo import ZoneInfoNotFoundError
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import asyncio
+from cache import TieredCache, make_shared_backend
+from write_behind import WriteBehindBuffer
+from write_journal import WriteJournal
+from realtime import BroadcastHub
+from compression import CompressionMiddleware, PrecompressedPayload
+from leases import try_acquire_lease
+from tiering import archive_older_than, ensure_archive_indexes, read_archive, unpack
+from journal_io import iter_journal, ndjson_stream, csv_stream, content_hash, JournalImporter
+import user_keys
+from bible import BibleIndex, parse_reference
+from similarity import SimilarityIndex
+from novelty import UserNovelty
+from music import MusicCatalog
+from jobs import JobQueue, JobWorkerPool, public_job
+from llm_cache import LLMResponseCache, cache_key
+from profiling import ProfileStore, ProfilerMiddleware
+from metrics import registry
+from loop_monitor import LoopLagMonitor, BlockingDetector
+from read_routing import ReadRouter, parse_routes
+from idempotency import IdempotencyMiddleware, ensure_idempotency_indexes
+from reminders import ReminderScheduler, load_notifier, next_fire_at, shard_of
+from reactions import ReactionAggregator
+from share_cards import CardRenderer, THEMES as CARD_THEMES
+from locales import DEFAULT_LOCALE, LOCALES, build_prompt, fallback_devotional, normalize_locale, parse_devotional
+from structured_logging import setup_logging, request_id_var, RequestIdMiddleware, MongoCommandLogger
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Logging Configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_JSON = os.getenv('LOG_JSON', 'true').lower() == 'true'
+# Fraction of INFO/DEBUG records kept; warnings and errors are always kept
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', 1.0))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+MONGO_SLOW_MS = float(os.getenv('MONGO_SLOW_MS', 100))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandLogger(MONGO_SLOW_MS)])
 db = client[os.environ['DB_NAME']]
 
+# Read preference Configuration: history reads may be served by secondaries
+READ_PREFERENCE_ROUTES = os.getenv(
+    'READ_PREFERENCE_ROUTES',
+    'devotionals=secondaryPreferred,gratitudes=secondaryPreferred'
+)
+READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', 90))
+
+read_router = ReadRouter(db, parse_routes(READ_PREFERENCE_ROUTES), READ_MAX_STALENESS_SECONDS)
+
+# Identifies this worker process in leases held on shared background jobs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-super-secret-jwt-key')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 720))
 
+# Accounts allowed to use the /api/admin endpoints
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()}
+
+# User key Configuration: "email" (legacy), "dual" (rollout) or "objectid"
+USER_KEY_MODE = os.getenv('USER_KEY_MODE', 'dual').lower()
+if USER_KEY_MODE not in user_keys.USER_KEY_MODES:
+    raise RuntimeError(f"USER_KEY_MODE must be one of {', '.join(user_keys.USER_KEY_MODES)}")
+USER_KEY_BACKFILL = os.getenv('USER_KEY_BACKFILL', 'false').lower() == 'true'
+
+# Bible index Configuration (built with `python bible.py build`)
+BIBLE_INDEX_PATH = Path(os.getenv('BIBLE_INDEX_PATH', str(ROOT_DIR / 'data' / 'bible_pt.idx')))
+# Language of the index; devotionals in other locales ask the LLM for the verse text
+BIBLE_INDEX_LOCALE = os.getenv('BIBLE_INDEX_LOCALE', 'pt')
+
+# Similarity index Configuration
+SIMILARITY_ENABLED = os.getenv('SIMILARITY_ENABLED', 'true').lower() == 'true'
+SIMILARITY_DIM = int(os.getenv('SIMILARITY_DIM', 512))
+# Scored against the theme and title of stored devotionals: same-theme matches
+# measure 0.5-0.85, unrelated ones stay under 0.4
+SIMILARITY_REUSE_THRESHOLD = float(os.getenv('SIMILARITY_REUSE_THRESHOLD', 0.5))
+SIMILARITY_REFRESH_SECONDS = int(os.getenv('SIMILARITY_REFRESH_SECONDS', 300))
+
+# One pool per locale: a devotional is only reused for users of its language
+similarity_indexes = {locale: SimilarityIndex(SIMILARITY_DIM) for locale in LOCALES} if SIMILARITY_ENABLED else None
+# Short themes score low against whole devotionals, so reuse matches them against themes and titles
+theme_indexes = {locale: SimilarityIndex(SIMILARITY_DIM) for locale in LOCALES} if SIMILARITY_ENABLED else None
+
+# Novelty filter Configuration
+NOVELTY_ENABLED = os.getenv('NOVELTY_ENABLED', 'true').lower() == 'true'
+NOVELTY_NEAR_DUP_THRESHOLD = float(os.getenv('NOVELTY_NEAR_DUP_THRESHOLD', 0.4))
+NOVELTY_CANDIDATES = int(os.getenv('NOVELTY_CANDIDATES', 10))
+
+# LLM response cache Configuration
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', str(ROOT_DIR / 'data' / 'llm_cache.sqlite3'))
+LLM_CACHE_MONGO = os.getenv('LLM_CACHE_MONGO', 'true').lower() == 'true'
+LLM_CACHE_TTL_HOURS = float(os.getenv('LLM_CACHE_TTL_HOURS', 168))
+LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', 64))
+# Answers kept per prompt; repeated prompts rotate among them
+LLM_CACHE_VARIANTS = int(os.getenv('LLM_CACHE_VARIANTS', 3))
+
+llm_cache = LLMResponseCache(
+    LLM_CACHE_PATH,
+    db if LLM_CACHE_MONGO else None,
+    ttl=LLM_CACHE_TTL_HOURS * 3600,
+    max_bytes=LLM_CACHE_MAX_MB << 20,
+    variants=LLM_CACHE_VARIANTS
+) if LLM_CACHE_ENABLED else None
+
+# Music catalog Configuration
+MUSIC_CATALOG_CACHE_SIZE = int(os.getenv('MUSIC_CATALOG_CACHE_SIZE', 50000))
+MUSIC_POPULAR_REFRESH_SECONDS = int(os.getenv('MUSIC_POPULAR_REFRESH_SECONDS', 300))
+MUSIC_BACKFILL = os.getenv('MUSIC_BACKFILL', 'false').lower() == 'true'
+
+music_catalog = MusicCatalog(db, MUSIC_CATALOG_CACHE_SIZE)
+
+# Category transitions kept per prayer
+PRAYER_CATEGORY_HISTORY_SIZE = int(os.getenv('PRAYER_CATEGORY_HISTORY_SIZE', 20))
+
+# Job queue Configuration
+# Generation workers in this process; 0 makes it enqueue-only
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('JOB_RETRY_BACKOFF_SECONDS', 5))
+JOB_POLL_INTERVAL_MS = int(os.getenv('JOB_POLL_INTERVAL_MS', 1000))
+JOB_RETENTION_HOURS = float(os.getenv('JOB_RETENTION_HOURS', 24))
+JOB_LONG_POLL_SECONDS = int(os.getenv('JOB_LONG_POLL_SECONDS', 25))
+
+job_queue = JobQueue(
+    db,
+    visibility_timeout=JOB_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retry_backoff=JOB_RETRY_BACKOFF_SECONDS,
+    retention_hours=JOB_RETENTION_HOURS
+)
+
+# Reminder Configuration
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'false').lower() == 'true'
+# Fixed for the lifetime of the data: reminders are stored with their shard
+REMINDER_SHARDS = int(os.getenv('REMINDER_SHARDS', 64))
+# Shards are split evenly among live workers; this only caps a worker's share (0: no cap)
+REMINDER_SHARDS_PER_WORKER = int(os.getenv('REMINDER_SHARDS_PER_WORKER', 0)) or None
+REMINDER_LEAD_MINUTES = float(os.getenv('REMINDER_LEAD_MINUTES', 5))
+REMINDER_SYNC_SECONDS = float(os.getenv('REMINDER_SYNC_SECONDS', 30))
+# "log" for the stub, or "package.module:Class"
+REMINDER_NOTIFIER = os.getenv('REMINDER_NOTIFIER', 'log')
+
+# Cache Configuration
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+CACHE_LOCAL_MAXSIZE = int(os.getenv('CACHE_LOCAL_MAXSIZE', 10000))
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv('CACHE_LOCAL_TTL_SECONDS', 5))
+CACHE_USER_TTL_SECONDS = int(os.getenv('CACHE_USER_TTL_SECONDS', 300))
+CACHE_DEVOTIONAL_TTL_SECONDS = int(os.getenv('CACHE_DEVOTIONAL_TTL_SECONDS', 3600))
+CACHE_FEED_TTL_SECONDS = int(os.getenv('CACHE_FEED_TTL_SECONDS', 30))
+
+shared_cache = make_shared_backend(CACHE_REDIS_URL)
+user_cache = TieredCache(
+    "users", shared_cache, CACHE_LOCAL_MAXSIZE,
+    ttl=CACHE_USER_TTL_SECONDS, local_ttl=CACHE_LOCAL_TTL_SECONDS
+)
+devotional_cache = TieredCache(
+    "devotional_today", shared_cache, CACHE_LOCAL_MAXSIZE,
+    ttl=CACHE_DEVOTIONAL_TTL_SECONDS, local_ttl=CACHE_LOCAL_TTL_SECONDS
+)
+feed_cache = TieredCache(
+    "public_feed", shared_cache, 16,
+    ttl=CACHE_FEED_TTL_SECONDS, local_ttl=CACHE_LOCAL_TTL_SECONDS
+)
+
+# Write-behind Configuration
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 100))
+WRITE_BEHIND_FLUSH_MS = int(os.getenv('WRITE_BEHIND_FLUSH_MS', 200))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', 1000))
+
+# Write journal Configuration
+WRITE_JOURNAL_ENABLED = os.getenv('WRITE_JOURNAL_ENABLED', 'false').lower() == 'true'
+WRITE_JOURNAL_DIR = os.getenv('WRITE_JOURNAL_DIR', str(ROOT_DIR / 'data' / 'journal'))
+# Inserts slower than this switch to the journal until MongoDB is healthy again
+WRITE_JOURNAL_SLO_MS = int(os.getenv('WRITE_JOURNAL_SLO_MS', 500))
+WRITE_JOURNAL_FSYNC_MS = int(os.getenv('WRITE_JOURNAL_FSYNC_MS', 5))
+WRITE_JOURNAL_REPLAY_SECONDS = float(os.getenv('WRITE_JOURNAL_REPLAY_SECONDS', 5))
+WRITE_JOURNAL_REPLAY_BATCH_SIZE = int(os.getenv('WRITE_JOURNAL_REPLAY_BATCH_SIZE', 500))
+
+# Reaction Configuration
+REACTIONS_FLUSH_MS = int(os.getenv('REACTIONS_FLUSH_MS', 1000))
+REACTIONS_MAX_PENDING = int(os.getenv('REACTIONS_MAX_PENDING', 10000))
+# Reflections whose reacting users are remembered in memory to drop repeated taps
+REACTIONS_TRACKED_REFLECTIONS = int(os.getenv('REACTIONS_TRACKED_REFLECTIONS', 1000))
+# The cached feed is reloaded at most this often to pick up new counts
+REACTIONS_FEED_REFRESH_SECONDS = float(os.getenv('REACTIONS_FEED_REFRESH_SECONDS', 5))
+
+# Live feed Configuration
+FEED_WS_QUEUE_SIZE = int(os.getenv('FEED_WS_QUEUE_SIZE', 32))
+FEED_WS_MAX_OVERFLOWS = int(os.getenv('FEED_WS_MAX_OVERFLOWS', 64))
+# Requires a replica set; lets reflections created on any worker reach every subscriber
+REFLECTIONS_CHANGE_STREAM = os.getenv('REFLECTIONS_CHANGE_STREAM', 'false').lower() == 'true'
+
+reflection_hub = BroadcastHub(queue_size=FEED_WS_QUEUE_SIZE, max_overflows=FEED_WS_MAX_OVERFLOWS)
+
+# Compression Configuration
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+# Cached payloads are compressed once and served many times, so spend more CPU on them
+PRECOMPRESS_GZIP_LEVEL = int(os.getenv('PRECOMPRESS_GZIP_LEVEL', 9))
+PRECOMPRESS_BROTLI_QUALITY = int(os.getenv('PRECOMPRESS_BROTLI_QUALITY', 9))
+
+def precompressed(content) -> PrecompressedPayload:
+    return PrecompressedPayload(
+        content, COMPRESSION_MIN_SIZE, PRECOMPRESS_GZIP_LEVEL, PRECOMPRESS_BROTLI_QUALITY
+    )
+
+# Share card Configuration
+CARD_DIR = os.getenv('CARD_DIR', str(ROOT_DIR / 'data' / 'cards'))
+CARD_WORKERS = int(os.getenv('CARD_WORKERS', 2))
+# A TrueType font; a common system serif font when unset
+CARD_FONT_PATH = os.getenv('CARD_FONT_PATH') or None
+CARD_MAX_FILES = int(os.getenv('CARD_MAX_FILES', 5000))
+# Card URLs never change content, so clients and CDNs may keep them for long
+CARD_MAX_AGE_SECONDS = int(os.getenv('CARD_MAX_AGE_SECONDS', 31536000))
+
+card_renderer = CardRenderer(CARD_DIR, workers=CARD_WORKERS, font_path=CARD_FONT_PATH, max_files=CARD_MAX_FILES)
+
+# Profiler Configuration
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0.0))
+# Comma-separated path prefixes that are always profiled, e.g. /api/devotionals
+PROFILER_ROUTES = [r.strip() for r in os.getenv('PROFILER_ROUTES', '').split(',') if r.strip()]
+# Requests sending "X-Profile: <token>" are profiled; disabled when empty
+PROFILER_HEADER_TOKEN = os.getenv('PROFILER_HEADER_TOKEN') or None
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 5))
+PROFILER_MAX_CONCURRENT = int(os.getenv('PROFILER_MAX_CONCURRENT', 2))
+PROFILER_DIR = os.getenv('PROFILER_DIR', str(ROOT_DIR / 'data' / 'profiles'))
+PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', 200))
+
+profile_store = ProfileStore(PROFILER_DIR, PROFILER_MAX_FILES) if PROFILER_ENABLED else None
+
+# Event loop monitoring Configuration
+# Lag sampling period; 0 disables the sampler
+LOOP_LAG_INTERVAL_MS = int(os.getenv('LOOP_LAG_INTERVAL_MS', 500))
+# Debug mode: record the stack of callbacks holding the loop past the threshold
+LOOP_BLOCKING_DETECTOR = os.getenv('LOOP_BLOCKING_DETECTOR', 'false').lower() == 'true'
+LOOP_BLOCKING_THRESHOLD_MS = int(os.getenv('LOOP_BLOCKING_THRESHOLD_MS', 100))
+LOOP_BLOCKING_MAX_REPORTS = int(os.getenv('LOOP_BLOCKING_MAX_REPORTS', 50))
+
+loop_lag_monitor = LoopLagMonitor(registry, LOOP_LAG_INTERVAL_MS / 1000) if LOOP_LAG_INTERVAL_MS > 0 else None
+blocking_detector = BlockingDetector(
+    registry, LOOP_BLOCKING_THRESHOLD_MS / 1000, LOOP_BLOCKING_MAX_REPORTS
+) if LOOP_BLOCKING_DETECTOR else None
+
+# Idempotency-Key Configuration
+IDEMPOTENCY_ENABLED = os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+IDEMPOTENCY_TTL_HOURS = float(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+IDEMPOTENCY_LOCAL_MAXSIZE = int(os.getenv('IDEMPOTENCY_LOCAL_MAXSIZE', 10000))
+# Long enough for a retry to wait out a devotional generation
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 60))
+IDEMPOTENT_PATHS = ("/api/prayers", "/api/gratitudes", "/api/reflections", "/api/devotionals/generate")
+
+# Tiering Configuration
+TIERING_ENABLED = os.getenv('TIERING_ENABLED', 'false').lower() == 'true'
+TIERING_INTERVAL_HOURS = float(os.getenv('TIERING_INTERVAL_HOURS', 24))
+ARCHIVE_COMPRESS = os.getenv('ARCHIVE_COMPRESS', 'true').lower() == 'true'
+DEVOTIONALS_HOT_DAYS = int(os.getenv('DEVOTIONALS_HOT_DAYS', 90))
+REFLECTIONS_HOT_DAYS = int(os.getenv('REFLECTIONS_HOT_DAYS', 180))
+# 0 keeps archived documents forever; otherwise a TTL index deletes them
+DEVOTIONALS_ARCHIVE_TTL_DAYS = int(os.getenv('DEVOTIONALS_ARCHIVE_TTL_DAYS', 0))
+REFLECTIONS_ARCHIVE_TTL_DAYS = int(os.getenv('REFLECTIONS_ARCHIVE_TTL_DAYS', 0))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -39,19 +301,23 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging: records are written from a background thread
+log_handler, log_listener = setup_logging(
+    getattr(logging, LOG_LEVEL, logging.INFO), LOG_JSON, LOG_INFO_SAMPLE_RATE, LOG_QUEUE_SIZE
 )
 logger = logging.getLogger(__name__)
 
+bible_index = BibleIndex(str(BIBLE_INDEX_PATH)) if BIBLE_INDEX_PATH.exists() else None
+if bible_index is None:
+    logger.warning(f"Bible index not found at {BIBLE_INDEX_PATH}, verse text will come from the LLM")
+
 # ============ MODELS ============
 
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
     name: str
+    locale: Optional[str] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -77,6 +343,16 @@ class PrayerCreate(BaseModel):
     category: str
     date: Optional[datetime] = None
 
+class ReminderSettings(BaseModel):
+    time: str = Field(pattern=r"^([01]\d|2[0-3]):[0-5]\d$")
+    timezone: str = "America/Sao_Paulo"
+
+class PrayerPatch(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    date: Optional[datetime] = None
+
 class Gratitude(BaseModel):
     id: Optional[str] = None
     user_id: str
@@ -129,17 +405,26 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Cached users never carry the password hash; login reads it from the database
+USER_PROJECTION = {"password": 0}
+
+async def load_user(uid: Optional[str], email: str):
+    if uid is not None:
+        return await db.users.find_one({"_id": ObjectId(uid)}, USER_PROJECTION)
+    # Tokens issued before user ids were carried in the JWT
+    return await db.users.find_one({"email": email}, USER_PROJECTION)
+
+async def get_user_from_token(token: str):
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         email: str = payload.get("sub")
+        uid: Optional[str] = payload.get("uid")
         if email is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials"
             )
-        user = await db.users.find_one({"email": email})
+        user = await user_cache.get_or_load(uid or email, lambda: load_user(uid, email))
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -152,99 +437,154 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials"
         )
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+async def get_admin_user(current_user = Depends(get_current_user)):
+    if current_user["email"].lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+def user_key(user: dict):
+    """Value stored in user_id for documents owned by the user"""
+    return user_keys.user_key(user, USER_KEY_MODE)
+
+def owner_filter(user: dict) -> dict:
+    """Query fragment matching documents owned by the user"""
+    return user_keys.owner_filter(user, USER_KEY_MODE)
+
+def user_locale(user: dict) -> str:
+    return normalize_locale(user.get("locale")) or DEFAULT_LOCALE
+
+def locale_filter(locale: str) -> dict:
+    """Query fragment matching devotionals in the locale; older ones without a locale are in the default"""
+    if locale == DEFAULT_LOCALE:
+        return {"locale": {"$in": [locale, None]}}
+    return {"locale": locale}
+
 # ============ AI HELPER ============
 
-async def generate_devotional_content(theme: str = None):
-    """Generate devotional content with verse and music suggestions"""
+async def generate_devotional_content(theme: str = None, fresh: bool = False, locale: str = DEFAULT_LOCALE):
+    """Generate devotional content with verse and music suggestions in ``locale``
+
+    ``fresh`` skips cached LLM answers (the new answer is still cached).
+    """
     try:
         emergent_key = os.getenv('EMERGENT_LLM_KEY')
+        provider, model = "openai", "gpt-5.2"
+        # With the local Bible index only the reference is requested; the text comes from the index
+        use_bible_index = bible_index is not None and locale == BIBLE_INDEX_LOCALE
+        system_message, prompt = build_prompt(locale, theme, reference_only=use_bible_index)
         
-        chat = LlmChat(
-            api_key=emergent_key,
-            session_id="devotional_gen",
-            system_message="Você é um assistente espiritual que cria devocionais cristãos inspiradores em português."
-        ).with_model("openai", "gpt-5.2")
-        
-        prompt = f"""Crie um devocional cristão completo em português com os seguintes elementos:
-
-1. TÍTULO: Um título inspirador e curto
-2. CONTEÚDO: Um texto devocional de 200-300 palavras que seja edificante, reflexivo e prático
-3. VERSÍCULO: Um versículo bíblico relevante (inclua referência completa - livro, capítulo e versículo)
-4. MÚSICAS: Sugira 3 músicas gospel (2 brasileiras e 1 internacional) relacionadas ao tema
-
-{f'Tema sugerido: {theme}' if theme else 'Escolha um tema espiritual relevante para hoje.'}
-
-Formato da resposta:
-TÍTULO: [título aqui]
-CONTEÚDO: [conteúdo aqui]
-VERSÍCULO: [versículo completo aqui]
-REFERÊNCIA: [Livro Capítulo:Versículo]
-MÚSICA_1: [Nome - Artista - País]
-MÚSICA_2: [Nome - Artista - País]
-MÚSICA_3: [Nome - Artista - País]"""
-
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Parse response
-        lines = response.split('\n')
-        parsed = {
-            'title': '',
-            'content': '',
-            'verse': '',
-            'verse_reference': '',
-            'music_suggestions': []
-        }
+        # The prompt is per locale, so cached answers are shared by every user of the locale
+        key = cache_key(provider, model, system_message, prompt) if llm_cache is not None else None
+        response = await llm_cache.get(key) if key is not None and not fresh else None
+        generated = response is None
+        if generated:
+            chat = LlmChat(
+                api_key=emergent_key,
+                session_id="devotional_gen",
+                system_message=system_message
+            ).with_model(provider, model)
+            user_message = UserMessage(text=prompt)
+            started = time.perf_counter()
+            response = await chat.send_message(user_message)
+            logger.info(f"LLM {provider}/{model} answered in {(time.perf_counter() - started) * 1000:.0f} ms ({locale})")
         
-        current_section = None
-        content_lines = []
+        parsed = parse_devotional(response, locale)
         
-        for line in lines:
-            line = line.strip()
-            if line.startswith('TÍTULO:'):
-                parsed['title'] = line.replace('TÍTULO:', '').strip()
-            elif line.startswith('CONTEÚDO:'):
-                current_section = 'content'
-                content_text = line.replace('CONTEÚDO:', '').strip()
-                if content_text:
-                    content_lines.append(content_text)
-            elif line.startswith('VERSÍCULO:'):
-                current_section = 'verse'
-                parsed['verse'] = line.replace('VERSÍCULO:', '').strip()
-            elif line.startswith('REFERÊNCIA:'):
-                current_section = None
-                parsed['verse_reference'] = line.replace('REFERÊNCIA:', '').strip()
-            elif line.startswith('MÚSICA_'):
-                current_section = None
-                music_info = line.split(':', 1)[1].strip()
-                parts = [p.strip() for p in music_info.split('-')]
-                if len(parts) >= 2:
-                    parsed['music_suggestions'].append({
-                        'name': parts[0],
-                        'artist': parts[1] if len(parts) > 1 else 'Desconhecido',
-                        'country': parts[2] if len(parts) > 2 else 'Brasil'
-                    })
-            elif current_section == 'content' and line and not line.startswith(('VERSÍCULO:', 'REFERÊNCIA:', 'MÚSICA_')):
-                content_lines.append(line)
+        # Canonicalize the reference and take the verse text from the local index
+        # (book names are parsed in the index's language only)
+        reference = parse_reference(parsed['verse_reference']) if locale == BIBLE_INDEX_LOCALE else None
+        if reference is not None:
+            parsed['verse_reference'] = str(reference)
+            verses = bible_index.passage(reference) if use_bible_index else None
+            if verses:
+                parsed['verse'] = ' '.join(text for _, text in verses)
+            elif use_bible_index:
+                raise ValueError(f"Verse not found in the Bible index: {parsed['verse_reference']}")
+        elif use_bible_index:
+            raise ValueError(f"Invalid verse reference: {parsed['verse_reference']}")
         
-        parsed['content'] = ' '.join(content_lines)
+        # Only answers that parsed and validated are worth serving again
+        if generated and key is not None:
+            await llm_cache.put(key, response)
         
         return parsed
         
     except Exception as e:
         logger.error(f"Error generating devotional: {str(e)}")
         # Return a fallback devotional
-        return {
-            'title': 'A Paz de Deus',
-            'content': 'A paz que vem de Deus é diferente de qualquer paz que o mundo pode oferecer. É uma paz que permanece mesmo em meio às tempestades da vida. Quando entregamos nossas preocupações a Deus em oração, Ele promete guardar nossos corações e mentes. Hoje, escolha confiar em Deus com cada detalhe da sua vida.',
-            'verse': 'E a paz de Deus, que excede todo o entendimento, guardará o coração e a mente de vocês em Cristo Jesus.',
-            'verse_reference': 'Filipenses 4:7',
-            'music_suggestions': [
-                {'name': 'A Paz do Céu', 'artist': 'Anderson Freire', 'country': 'Brasil'},
-                {'name': 'Deus Cuida de Mim', 'artist': 'Kleber Lucas', 'country': 'Brasil'},
-                {'name': 'Peace', 'artist': 'Hillsong Worship', 'country': 'Internacional'}
-            ]
-        }
+        return fallback_devotional(locale)
+
+# ============ WRITE HELPERS ============
+
+async def on_write_behind_flush(collection_name: str, documents: List[dict]):
+    if collection_name == "reflections" and any(d.get("is_public") for d in documents):
+        await feed_cache.invalidate("latest")
+
+write_behind = WriteBehindBuffer(
+    db,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_MS / 1000,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    on_flush=on_write_behind_flush
+) if WRITE_BEHIND_ENABLED else None
+
+feed_counts_refreshed_at = 0.0
+feed_counts_refresh: Optional[asyncio.Task] = None
+
+async def refresh_feed_counts(delay: float):
+    """Trailing refresh: reactions flushed inside the throttle window still reach the feed"""
+    global feed_counts_refreshed_at, feed_counts_refresh
+    try:
+        await asyncio.sleep(delay)
+        feed_counts_refreshed_at = time.monotonic()
+        await feed_cache.invalidate("latest")
+    except Exception as e:
+        logger.warning(f"Error refreshing feed counts: {str(e)}")
+    finally:
+        feed_counts_refresh = None
+
+async def on_reactions_flush(reflection_ids: List[ObjectId]):
+    global feed_counts_refreshed_at, feed_counts_refresh
+    wait = REACTIONS_FEED_REFRESH_SECONDS - (time.monotonic() - feed_counts_refreshed_at)
+    if wait <= 0:
+        feed_counts_refreshed_at = time.monotonic()
+        await feed_cache.invalidate("latest")
+    elif feed_counts_refresh is None:
+        feed_counts_refresh = asyncio.create_task(refresh_feed_counts(wait))
+
+amen_reactions = ReactionAggregator(
+    db,
+    flush_interval=REACTIONS_FLUSH_MS / 1000,
+    max_pending=REACTIONS_MAX_PENDING,
+    tracked_reflections=REACTIONS_TRACKED_REFLECTIONS,
+    on_flush=on_reactions_flush
+)
+
+write_journal = WriteJournal(
+    db,
+    WRITE_JOURNAL_DIR,
+    WORKER_ID,
+    slo=WRITE_JOURNAL_SLO_MS / 1000,
+    fsync_interval=WRITE_JOURNAL_FSYNC_MS / 1000,
+    replay_interval=WRITE_JOURNAL_REPLAY_SECONDS,
+    replay_batch_size=WRITE_JOURNAL_REPLAY_BATCH_SIZE,
+    on_replay=on_write_behind_flush
+) if WRITE_JOURNAL_ENABLED else None
+
+async def insert_document(collection_name: str, document: dict, buffered: bool = True) -> str:
+    """Insert a document, through the write-behind buffer (if ``buffered``) or the write journal when enabled
+
+    Both insert a copy of ``document``, which the caller may keep using.
+    """
+    if buffered and write_behind is not None:
+        return str(await write_behind.insert(collection_name, document))
+    if write_journal is not None:
+        return str(await write_journal.insert(collection_name, document))
+    result = await db[collection_name].insert_one(document)
+    return str(result.inserted_id)
 
 # ============ ROUTES ============
 
@@ -265,13 +605,14 @@ async def register(user_data: UserRegister):
         "name": user_data.name,
         "password": hashed_password,
         "theme": "light",
+        "locale": normalize_locale(user_data.locale) or DEFAULT_LOCALE,
         "created_at": datetime.utcnow()
     }
     
-    await db.users.insert_one(user_dict)
+    result = await db.users.insert_one(user_dict)
     
     # Create token
-    access_token = create_access_token(data={"sub": user_data.email})
+    access_token = create_access_token(data={"sub": user_data.email, "uid": str(result.inserted_id)})
     
     return {
         "access_token": access_token,
@@ -279,7 +620,8 @@ async def register(user_data: UserRegister):
         "user": {
             "email": user_dict["email"],
             "name": user_dict["name"],
-            "theme": user_dict["theme"]
+            "theme": user_dict["theme"],
+            "locale": user_dict["locale"]
         }
     }
 
@@ -292,7 +634,7 @@ async def login(user_data: UserLogin):
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(data={"sub": user_data.email})
+    access_token = create_access_token(data={"sub": user["email"], "uid": str(user["_id"])})
     
     return {
         "access_token": access_token,
@@ -300,7 +642,8 @@ async def login(user_data: UserLogin):
         "user": {
             "email": user["email"],
             "name": user["name"],
-            "theme": user.get("theme", "light")
+            "theme": user.get("theme", "light"),
+            "locale": user_locale(user)
         }
     }
 
@@ -309,67 +652,233 @@ async def get_me(current_user = Depends(get_current_user)):
     return {
         "email": current_user["email"],
         "name": current_user["name"],
-        "theme": current_user.get("theme", "light")
+        "theme": current_user.get("theme", "light"),
+        "locale": user_locale(current_user)
     }
 
 @api_router.put("/auth/theme")
 async def update_theme(theme: dict, current_user = Depends(get_current_user)):
     await db.users.update_one(
-        {"email": current_user["email"]},
+        {"_id": current_user["_id"]},
         {"$set": {"theme": theme.get("theme", "light")}}
     )
+    await user_cache.invalidate(str(current_user["_id"]), current_user["email"])
     return {"success": True}
 
+@api_router.put("/auth/locale")
+async def update_locale(locale: dict, current_user = Depends(get_current_user)):
+    """Set the language devotionals are generated in"""
+    value = normalize_locale(locale.get("locale"))
+    if value is None:
+        raise HTTPException(status_code=400, detail=f"Locale must be one of: {', '.join(LOCALES)}")
+    await db.users.update_one(
+        {"_id": current_user["_id"]},
+        {"$set": {"locale": value}}
+    )
+    await user_cache.invalidate(str(current_user["_id"]), current_user["email"])
+    return {"success": True, "locale": value}
+
+# ============ VERSES ============
+
+@api_router.get("/verses/{ref}")
+async def get_verse(ref: str):
+    """Look up a passage such as "Filipenses 4:6-7" in the local Bible index"""
+    if bible_index is None:
+        raise HTTPException(status_code=503, detail="Bible index not available")
+    
+    reference = parse_reference(ref)
+    if reference is None:
+        raise HTTPException(status_code=400, detail="Invalid verse reference")
+    
+    verses = bible_index.passage(reference)
+    if not verses:
+        raise HTTPException(status_code=404, detail="Verse not found")
+    
+    return {
+        "reference": str(reference),
+        "book": reference.book_name,
+        "chapter": reference.chapter,
+        "verses": [{"verse": number, "text": text} for number, text in verses],
+        "text": " ".join(text for _, text in verses)
+    }
+
 # ============ DEVOTIONALS ============
 
+def devotional_text(devotional: dict) -> str:
+    return " ".join([devotional.get("title", ""), devotional.get("content", ""), devotional.get("verse_reference", "")])
+
+def devotional_theme_text(devotional: dict) -> str:
+    return " ".join([devotional.get("theme") or "", devotional.get("title", "")])
+
+async def find_devotional(devotional_id) -> Optional[dict]:
+    """Find a devotional by id in the hot collection or the archive"""
+    devotional = await db.devotionals.find_one({"_id": devotional_id})
+    if devotional is None:
+        archived = await read_archive(db, "devotionals", {"_id": devotional_id}, 0, 1)
+        devotional = archived[0] if archived else None
+    if devotional is not None:
+        await music_catalog.attach([devotional])
+    return devotional
+
+async def pick_devotional_content(current_user: dict, theme: Optional[str] = None):
+    """Reuse a stored devotional close to the theme that the user has not seen, or generate a new one"""
+    novelty = await UserNovelty.load(db, current_user["_id"]) if NOVELTY_ENABLED else None
+    locale = user_locale(current_user)
+    theme_index = theme_indexes[locale] if theme_indexes is not None else None
+    content = None
+    
+    if theme and theme_index is not None:
+        matches = await asyncio.to_thread(theme_index.search, theme, NOVELTY_CANDIDATES)
+        for devotional_id, score in matches:
+            if score < SIMILARITY_REUSE_THRESHOLD:
+                break
+            source = await find_devotional(ObjectId(devotional_id))
+            if source is None:
+                continue
+            if novelty is None or novelty.is_novel(source, NOVELTY_NEAR_DUP_THRESHOLD):
+                content = {
+                    "title": source["title"],
+                    "content": source["content"],
+                    "verse": source["verse"],
+                    "verse_reference": source["verse_reference"],
+                    "music_suggestions": source["music_suggestions"]
+                }
+                break
+    
+    if content is None:
+        content = await generate_devotional_content(theme, locale=locale)
+        # Cached answers rotate among a few variants; ask for a new one if the user has seen it
+        if llm_cache is not None and novelty is not None and not novelty.is_novel(content, NOVELTY_NEAR_DUP_THRESHOLD):
+            content = await generate_devotional_content(theme, fresh=True, locale=locale)
+    
+    if novelty is not None:
+        await novelty.record(db, content)
+    return content
+
+async def get_or_create_today_devotional(current_user: dict, today: datetime, theme: Optional[str] = None):
+    """Return the devotional of the day starting at ``today`` for the user, generating it if missing"""
+    locale = user_locale(current_user)
+    existing = await db.devotionals.find_one({
+        **owner_filter(current_user),
+        **locale_filter(locale),
+        "date": {"$gte": today}
+    })
+    
+    if existing:
+        await music_catalog.attach([existing])
+        return precompressed({
+            "id": str(existing["_id"]),
+            "title": existing["title"],
+            "content": existing["content"],
+            "verse": existing["verse"],
+            "verse_reference": existing["verse_reference"],
+            "music_suggestions": existing["music_suggestions"],
+            "date": existing["date"].isoformat()
+        })
+    
+    # Generate new devotional
+    devotional_data = await pick_devotional_content(current_user, theme)
+    # Fallback content suggests the same songs every time; it does not make them popular
+    music_ids = await music_catalog.register(devotional_data["music_suggestions"], counted=not devotional_data.get("fallback"))
+    
+    devotional = {
+        "user_id": user_key(current_user),
+        "title": devotional_data["title"],
+        "content": devotional_data["content"],
+        "verse": devotional_data["verse"],
+        "verse_reference": devotional_data["verse_reference"],
+        "music_ids": music_ids,
+        "locale": locale,
+        "theme": theme,
+        # A reminder prepares the devotional a few minutes ahead, possibly before
+        # its day starts; it is dated in that day so the lookup above finds it
+        "date": max(datetime.utcnow(), today),
+        "created_at": datetime.utcnow()
+    }
+    if devotional_data.get("fallback"):
+        devotional["fallback"] = True
+    
+    result = await db.devotionals.insert_one(devotional)
+    devotional["id"] = str(result.inserted_id)
+    if similarity_indexes is not None:
+        similarity_indexes[locale].add(devotional["id"], devotional_text(devotional))
+        # Fallback content is not about the theme it was served for, so it is never reused for it
+        if not devotional.get("fallback"):
+            theme_indexes[locale].add(devotional["id"], devotional_theme_text(devotional))
+    
+    return precompressed({
+        "id": devotional["id"],
+        "title": devotional["title"],
+        "content": devotional["content"],
+        "verse": devotional["verse"],
+        "verse_reference": devotional["verse_reference"],
+        "music_suggestions": await music_catalog.resolve(music_ids),
+        "date": devotional["date"].isoformat()
+    })
+
+def devotional_cache_key(user: dict, day: datetime) -> str:
+    """Key of the user's devotional of the day, in their current locale"""
+    return f"{user['_id']}:{user_locale(user)}:{day.date().isoformat()}"
+
+async def run_devotional_job(job_payload: dict):
+    """Job handler: generate the day's devotional for a user and return its JSON"""
+    # Logs of the job carry the id of the request that enqueued it
+    request_id_var.set(job_payload.get("request_id"))
+    current_user = await db.users.find_one({"_id": ObjectId(job_payload["user_id"])})
+    if current_user is None:
+        raise ValueError("User not found")
+    today = datetime.fromisoformat(job_payload["date"])
+    cache_key = devotional_cache_key(current_user, today)
+    payload = await devotional_cache.get_or_load(
+        cache_key, lambda: get_or_create_today_devotional(current_user, today, job_payload.get("theme"))
+    )
+    return json.loads(payload.body)
+
+job_pool = JobWorkerPool(
+    job_queue,
+    {"devotional": run_devotional_job},
+    WORKER_ID,
+    concurrency=JOB_WORKERS,
+    poll_interval=JOB_POLL_INTERVAL_MS / 1000
+) if JOB_WORKERS > 0 else None
+
 @api_router.post("/devotionals/generate")
-async def generate_devotional(current_user = Depends(get_current_user)):
-    """Generate a new daily devotional"""
+async def generate_devotional(request: Request, theme: Optional[str] = Query(None, max_length=200), current_user = Depends(get_current_user)):
+    """Generate a new daily devotional, optionally around a theme
+
+    With `Prefer: respond-async` generation runs in the job queue and the
+    response is 202 with the job to poll at /api/jobs/{id}.
+    """
     try:
-        # Check if user already has a devotional for today
+        # Concurrent requests for the same user and day share one lookup/generation
         today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        existing = await db.devotionals.find_one({
-            "user_id": current_user["email"],
-            "date": {"$gte": today}
-        })
-        
-        if existing:
-            return {
-                "id": str(existing["_id"]),
-                "title": existing["title"],
-                "content": existing["content"],
-                "verse": existing["verse"],
-                "verse_reference": existing["verse_reference"],
-                "music_suggestions": existing["music_suggestions"],
-                "date": existing["date"].isoformat()
-            }
+        cache_key = devotional_cache_key(current_user, today)
         
-        # Generate new devotional
-        devotional_data = await generate_devotional_content()
-        
-        devotional = {
-            "user_id": current_user["email"],
-            "title": devotional_data["title"],
-            "content": devotional_data["content"],
-            "verse": devotional_data["verse"],
-            "verse_reference": devotional_data["verse_reference"],
-            "music_suggestions": devotional_data["music_suggestions"],
-            "date": datetime.utcnow(),
-            "created_at": datetime.utcnow()
-        }
-        
-        result = await db.devotionals.insert_one(devotional)
-        devotional["id"] = str(result.inserted_id)
+        if "respond-async" in request.headers.get("prefer", "").lower():
+            cached = await devotional_cache.get(cache_key)
+            if cached is not None:
+                return cached.response(request.headers.get("accept-encoding", ""))
+            job = await job_queue.enqueue(
+                "devotional",
+                {
+                    "user_id": str(current_user["_id"]),
+                    "date": today.isoformat(),
+                    "theme": theme,
+                    "request_id": request_id_var.get()
+                },
+                owner=str(current_user["_id"]),
+                dedupe_key=f"devotional:{cache_key}"
+            )
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=public_job(job),
+                headers={"Location": f"/api/jobs/{job['_id']}", "Preference-Applied": "respond-async"}
+            )
         
-        return {
-            "id": devotional["id"],
-            "title": devotional["title"],
-            "content": devotional["content"],
-            "verse": devotional["verse"],
-            "verse_reference": devotional["verse_reference"],
-            "music_suggestions": devotional["music_suggestions"],
-            "date": devotional["date"].isoformat()
-        }
+        payload = await devotional_cache.get_or_load(
+            cache_key, lambda: get_or_create_today_devotional(current_user, today, theme)
+        )
+        return payload.response(request.headers.get("accept-encoding", ""))
         
     except Exception as e:
         logger.error(f"Error in generate_devotional: {str(e)}")
@@ -381,10 +890,18 @@ async def generate_devotional(current_user = Depends(get_current_user)):
 @api_router.get("/devotionals")
 async def get_devotionals(current_user = Depends(get_current_user)):
     """Get user's devotionals"""
-    devotionals = await db.devotionals.find(
-        {"user_id": current_user["email"]}
+    history_db = read_router.db("devotionals")
+    devotionals = await history_db.devotionals.find(
+        owner_filter(current_user)
     ).sort("date", -1).limit(30).to_list(30)
     
+    # Users with sparse history may have part of their latest 30 in the archive
+    if TIERING_ENABLED and len(devotionals) < 30:
+        seen = {d["_id"] for d in devotionals}
+        archived = await read_archive(history_db, "devotionals", owner_filter(current_user), 0, 30 - len(devotionals))
+        devotionals += [d for d in archived if d["_id"] not in seen]
+    await music_catalog.attach(devotionals)
+    
     return [
         {
             "id": str(d["_id"]),
@@ -398,24 +915,209 @@ async def get_devotionals(current_user = Depends(get_current_user)):
         for d in devotionals
     ]
 
+@api_router.get("/devotionals/{devotional_id}/card.png")
+async def devotional_card(devotional_id: str, theme: str = "light"):
+    """Share card with the devotional's verse. Public, so the image can be shared by link;
+    it shows only the verse and its reference."""
+    if theme not in CARD_THEMES:
+        raise HTTPException(status_code=400, detail=f"Theme must be one of: {', '.join(CARD_THEMES)}")
+    if not ObjectId.is_valid(devotional_id):
+        raise HTTPException(status_code=404, detail="Devotional not found")
+    devotional = await find_devotional(ObjectId(devotional_id))
+    if devotional is None or not devotional.get("verse"):
+        raise HTTPException(status_code=404, detail="Devotional not found")
+    
+    path = await card_renderer.render(devotional["verse"], devotional.get("verse_reference", ""), theme)
+    return FileResponse(
+        path,
+        media_type="image/png",
+        headers={"Cache-Control": f"public, max-age={CARD_MAX_AGE_SECONDS}, immutable"}
+    )
+
+@api_router.get("/devotionals/search")
+async def search_devotionals(theme: str = Query(..., min_length=2, max_length=200), k: int = 5, current_user = Depends(get_current_user)):
+    """Find stored devotionals closest to a theme"""
+    if similarity_indexes is None:
+        raise HTTPException(status_code=503, detail="Devotional search not available")
+    
+    similarity_index = similarity_indexes[user_locale(current_user)]
+    matches = await asyncio.to_thread(similarity_index.search, theme, max(1, min(k, 20)))
+    results = []
+    for devotional_id, score in matches:
+        d = await find_devotional(ObjectId(devotional_id))
+        if d is None:
+            continue
+        results.append({
+            "id": str(d["_id"]),
+            "title": d["title"],
+            "content": d["content"],
+            "verse": d["verse"],
+            "verse_reference": d["verse_reference"],
+            "music_suggestions": d["music_suggestions"],
+            "score": round(score, 4)
+        })
+    return results
+
+@api_router.get("/devotionals/archive")
+async def get_archived_devotionals(skip: int = 0, limit: int = 30, current_user = Depends(get_current_user)):
+    """Get user's older devotionals from the archive"""
+    limit = max(1, min(limit, 100))
+    devotionals = await read_archive(read_router.db("devotionals"), "devotionals", owner_filter(current_user), max(skip, 0), limit)
+    await music_catalog.attach(devotionals)
+    
+    return [
+        {
+            "id": str(d["_id"]),
+            "title": d["title"],
+            "content": d["content"],
+            "verse": d["verse"],
+            "verse_reference": d["verse_reference"],
+            "music_suggestions": d["music_suggestions"],
+            "date": d["date"].isoformat()
+        }
+        for d in devotionals
+    ]
+
+# ============ REMINDERS ============
+
+async def prepare_reminder_devotional(reminder: dict):
+    """Queue the devotional of the reminder's day so it is ready when the user opens it"""
+    day = reminder["fire_at"].replace(hour=0, minute=0, second=0, microsecond=0)
+    user = await db.users.find_one({"_id": reminder["user_id"]}, {"locale": 1})
+    if user is None:
+        return
+    await job_queue.enqueue(
+        "devotional",
+        {"user_id": str(reminder["user_id"]), "date": day.isoformat(), "theme": None, "request_id": None},
+        owner=str(reminder["user_id"]),
+        dedupe_key=f"devotional:{devotional_cache_key(user, day)}"
+    )
+
+reminder_scheduler = ReminderScheduler(
+    db,
+    WORKER_ID,
+    load_notifier(REMINDER_NOTIFIER),
+    prepare_reminder_devotional,
+    shards=REMINDER_SHARDS,
+    max_shards=REMINDER_SHARDS_PER_WORKER,
+    lead=REMINDER_LEAD_MINUTES * 60,
+    sync_interval=REMINDER_SYNC_SECONDS
+) if REMINDERS_ENABLED else None
+
+def reminder_response(reminder: Optional[dict]) -> dict:
+    if reminder is None or not reminder.get("enabled"):
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "time": reminder["time"],
+        "timezone": reminder["timezone"],
+        "next_fire_at": reminder["next_fire_at"].isoformat()
+    }
+
+@api_router.get("/reminders")
+async def get_reminder(current_user = Depends(get_current_user)):
+    return reminder_response(await db.reminders.find_one({"_id": current_user["_id"]}))
+
+@api_router.put("/reminders")
+async def set_reminder(settings: ReminderSettings, current_user = Depends(get_current_user)):
+    """Set the local time of the user's daily devotional reminder"""
+    try:
+        fire_at = next_fire_at(settings.time, settings.timezone, datetime.utcnow())
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+    
+    reminder = await db.reminders.find_one_and_update(
+        {"_id": current_user["_id"]},
+        {"$set": {
+            "shard": shard_of(current_user["_id"], REMINDER_SHARDS),
+            "time": settings.time,
+            "timezone": settings.timezone,
+            "enabled": True,
+            "next_fire_at": fire_at,
+            "updated_at": datetime.utcnow()
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Other workers pick the change up on their next sync
+    if reminder_scheduler is not None:
+        reminder_scheduler.apply(reminder)
+    return reminder_response(reminder)
+
+@api_router.delete("/reminders")
+async def delete_reminder(current_user = Depends(get_current_user)):
+    # Disabled rather than deleted so the owning worker sees the change when it syncs
+    reminder = await db.reminders.find_one_and_update(
+        {"_id": current_user["_id"]},
+        {"$set": {"enabled": False, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if reminder is not None and reminder_scheduler is not None:
+        reminder_scheduler.apply(reminder)
+    return {"success": True}
+
+# ============ JOBS ============
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: int = 0, current_user = Depends(get_current_user)):
+    """Job status; with `wait` the request long-polls up to that many seconds for the result"""
+    job = None
+    if ObjectId.is_valid(job_id):
+        job_id = ObjectId(job_id)
+        if wait > 0:
+            job = await job_queue.wait(job_id, min(wait, JOB_LONG_POLL_SECONDS), JOB_POLL_INTERVAL_MS / 1000)
+        else:
+            job = await job_queue.get(job_id)
+    if job is None or job["owner"] != str(current_user["_id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_job(job)
+
+# ============ MUSIC ============
+
+@api_router.get("/music/popular")
+async def get_popular_music(limit: int = 20, current_user = Depends(get_current_user)):
+    """Most suggested songs, from the periodically refreshed catalog counts"""
+    return music_catalog.popular(max(1, min(limit, 50)))
+
+async def run_music_catalog():
+    """Migrate embedded music suggestions if enabled, then keep the popular list fresh"""
+    try:
+        await music_catalog.ensure_indexes()
+        if MUSIC_BACKFILL and await try_acquire_lease(db, "music_backfill", WORKER_ID, 3600):
+            migrated = await music_catalog.backfill()
+            logger.info(f"Music backfill finished, {migrated} devotionals migrated")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error preparing music catalog: {str(e)}")
+    while True:
+        try:
+            await music_catalog.refresh_popular()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error refreshing popular music: {str(e)}")
+        await asyncio.sleep(MUSIC_POPULAR_REFRESH_SECONDS)
+
 # ============ PRAYERS ============
 
 @api_router.post("/prayers")
 async def create_prayer(prayer_data: PrayerCreate, current_user = Depends(get_current_user)):
     prayer = {
-        "user_id": current_user["email"],
+        "user_id": user_key(current_user),
         "title": prayer_data.title,
         "content": prayer_data.content,
         "category": prayer_data.category,
         "date": prayer_data.date or datetime.utcnow(),
         "created_at": datetime.utcnow()
     }
+    prayer["content_hash"] = content_hash("prayer", prayer["title"], prayer["content"], prayer["date"])
     
-    result = await db.prayers.insert_one(prayer)
-    prayer["id"] = str(result.inserted_id)
+    # Prayers are not write-behind buffered: they can be edited right after creation
+    prayer_id = await insert_document("prayers", prayer, buffered=False)
     
     return {
-        "id": prayer["id"],
+        "id": prayer_id,
         "title": prayer["title"],
         "content": prayer["content"],
         "category": prayer["category"],
@@ -424,7 +1126,7 @@ async def create_prayer(prayer_data: PrayerCreate, current_user = Depends(get_cu
 
 @api_router.get("/prayers")
 async def get_prayers(category: Optional[str] = None, current_user = Depends(get_current_user)):
-    query = {"user_id": current_user["email"]}
+    query = owner_filter(current_user)
     if category:
         query["category"] = category
     
@@ -443,10 +1145,8 @@ async def get_prayers(category: Optional[str] = None, current_user = Depends(get
 
 @api_router.put("/prayers/{prayer_id}")
 async def update_prayer(prayer_id: str, prayer_data: PrayerCreate, current_user = Depends(get_current_user)):
-    from bson import ObjectId
-    
     result = await db.prayers.update_one(
-        {"_id": ObjectId(prayer_id), "user_id": current_user["email"]},
+        {"_id": ObjectId(prayer_id), **owner_filter(current_user)},
         {"$set": {
             "title": prayer_data.title,
             "content": prayer_data.content,
@@ -460,12 +1160,62 @@ async def update_prayer(prayer_id: str, prayer_data: PrayerCreate, current_user
     
     return {"success": True}
 
+@api_router.patch("/prayers/{prayer_id}")
+async def patch_prayer(prayer_id: str, prayer_data: PrayerPatch, current_user = Depends(get_current_user)):
+    """Update only the fields sent and return the updated prayer"""
+    changes = prayer_data.model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    # Update pipeline: $literal keeps user text starting with "$" from being read as a field path
+    pipeline = []
+    if "category" in changes:
+        # Runs before the category is overwritten, so "$category" is still the old value
+        history = {"$ifNull": ["$category_history", []]}
+        pipeline.append({"$set": {"category_history": {"$cond": [
+            {"$ne": ["$category", {"$literal": changes["category"]}]},
+            {"$slice": [
+                {"$concatArrays": [history, [{
+                    "from": "$category",
+                    "to": {"$literal": changes["category"]},
+                    "at": datetime.utcnow()
+                }]]},
+                -PRAYER_CATEGORY_HISTORY_SIZE
+            ]},
+            history
+        ]}}})
+    pipeline.append({"$set": {field: {"$literal": value} for field, value in changes.items()}})
+    
+    prayer = await db.prayers.find_one_and_update(
+        {"_id": ObjectId(prayer_id), **owner_filter(current_user)},
+        pipeline,
+        projection={"title": 1, "content": 1, "category": 1, "date": 1, "content_hash": 1, "category_history": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if prayer is None:
+        raise HTTPException(status_code=404, detail="Prayer not found")
+    
+    # Keep the import deduplication hash in step with edited text
+    new_hash = content_hash("prayer", prayer["title"], prayer["content"], prayer["date"])
+    if new_hash != prayer.get("content_hash"):
+        await db.prayers.update_one({"_id": prayer["_id"]}, {"$set": {"content_hash": new_hash}})
+    
+    return {
+        "id": str(prayer["_id"]),
+        "title": prayer["title"],
+        "content": prayer["content"],
+        "category": prayer["category"],
+        "date": prayer["date"].isoformat(),
+        "category_history": [
+            {"from": h["from"], "to": h["to"], "at": h["at"].isoformat()}
+            for h in prayer.get("category_history", [])
+        ]
+    }
+
 @api_router.delete("/prayers/{prayer_id}")
 async def delete_prayer(prayer_id: str, current_user = Depends(get_current_user)):
-    from bson import ObjectId
-    
     result = await db.prayers.delete_one(
-        {"_id": ObjectId(prayer_id), "user_id": current_user["email"]}
+        {"_id": ObjectId(prayer_id), **owner_filter(current_user)}
     )
     
     if result.deleted_count == 0:
@@ -478,25 +1228,25 @@ async def delete_prayer(prayer_id: str, current_user = Depends(get_current_user)
 @api_router.post("/gratitudes")
 async def create_gratitude(gratitude_data: GratitudeCreate, current_user = Depends(get_current_user)):
     gratitude = {
-        "user_id": current_user["email"],
+        "user_id": user_key(current_user),
         "content": gratitude_data.content,
         "date": gratitude_data.date or datetime.utcnow(),
         "created_at": datetime.utcnow()
     }
+    gratitude["content_hash"] = content_hash("gratitude", None, gratitude["content"], gratitude["date"])
     
-    result = await db.gratitudes.insert_one(gratitude)
-    gratitude["id"] = str(result.inserted_id)
+    gratitude_id = await insert_document("gratitudes", gratitude)
     
     return {
-        "id": gratitude["id"],
+        "id": gratitude_id,
         "content": gratitude["content"],
         "date": gratitude["date"].isoformat()
     }
 
 @api_router.get("/gratitudes")
 async def get_gratitudes(current_user = Depends(get_current_user)):
-    gratitudes = await db.gratitudes.find(
-        {"user_id": current_user["email"]}
+    gratitudes = await read_router.db("gratitudes").gratitudes.find(
+        owner_filter(current_user)
     ).sort("date", -1).to_list(100)
     
     return [
@@ -510,10 +1260,8 @@ async def get_gratitudes(current_user = Depends(get_current_user)):
 
 @api_router.delete("/gratitudes/{gratitude_id}")
 async def delete_gratitude(gratitude_id: str, current_user = Depends(get_current_user)):
-    from bson import ObjectId
-    
     result = await db.gratitudes.delete_one(
-        {"_id": ObjectId(gratitude_id), "user_id": current_user["email"]}
+        {"_id": ObjectId(gratitude_id), **owner_filter(current_user)}
     )
     
     if result.deleted_count == 0:
@@ -526,7 +1274,7 @@ async def delete_gratitude(gratitude_id: str, current_user = Depends(get_current
 @api_router.post("/reflections")
 async def create_reflection(reflection_data: ReflectionCreate, current_user = Depends(get_current_user)):
     reflection = {
-        "user_id": current_user["email"],
+        "user_id": user_key(current_user),
         "user_name": current_user["name"],
         "content": reflection_data.content,
         "type": reflection_data.type,
@@ -535,37 +1283,250 @@ async def create_reflection(reflection_data: ReflectionCreate, current_user = De
         "created_at": datetime.utcnow()
     }
     
-    result = await db.reflections.insert_one(reflection)
-    reflection["id"] = str(result.inserted_id)
+    reflection_id = await insert_document("reflections", reflection)
+    # With write-behind the feed is invalidated once the batch is flushed
+    if reflection["is_public"] and write_behind is None:
+        await feed_cache.invalidate("latest")
     
-    return {
-        "id": reflection["id"],
+    response = {
+        "id": reflection_id,
         "user_name": reflection["user_name"],
         "content": reflection["content"],
         "type": reflection["type"],
-        "date": reflection["date"].isoformat()
+        "date": reflection["date"].isoformat(),
+        "amen_count": 0
     }
+    
+    # The change stream publishes it otherwise, on every worker
+    if reflection["is_public"] and not REFLECTIONS_CHANGE_STREAM:
+        reflection_hub.publish({"type": "reflection", "data": response})
+    
+    return response
 
-@api_router.get("/reflections/public")
-async def get_public_reflections(current_user = Depends(get_current_user)):
+async def load_public_reflections():
+    # From the primary: the feed is reloaded right after a write invalidates it, and
+    # a lagging secondary would keep the stale feed cached for the whole TTL
     reflections = await db.reflections.find(
         {"is_public": True}
     ).sort("date", -1).limit(50).to_list(50)
     
-    return [
+    return precompressed([
         {
             "id": str(r["_id"]),
             "user_name": r["user_name"],
             "content": r["content"],
             "type": r["type"],
-            "date": r["date"].isoformat()
+            "date": r["date"].isoformat(),
+            # Stored count plus the reactions this worker has not flushed yet
+            "amen_count": r.get("amen_count", 0) + amen_reactions.pending_for(r["_id"])
         }
         for r in reflections
+    ])
+
+@api_router.get("/reflections/public")
+async def get_public_reflections(request: Request, current_user = Depends(get_current_user)):
+    payload = await feed_cache.get_or_load("latest", load_public_reflections)
+    return payload.response(request.headers.get("accept-encoding", ""))
+
+@api_router.post("/reflections/{reflection_id}/amen")
+async def react_amen(reflection_id: str, current_user = Depends(get_current_user)):
+    """Say "amém" to a public reflection; repeated reactions by the same user are ignored"""
+    if not ObjectId.is_valid(reflection_id):
+        raise HTTPException(status_code=404, detail="Reflection not found")
+    oid = ObjectId(reflection_id)
+    if not amen_reactions.known(oid):
+        exists = await db.reflections.find_one({"_id": oid, "is_public": True}, {"_id": 1})
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Reflection not found")
+    
+    counted = await amen_reactions.react(oid, user_key(current_user))
+    return {"success": True, "counted": counted}
+
+@api_router.websocket("/ws/reflections")
+async def reflections_feed(websocket: WebSocket, token: str = Query(...)):
+    """Push new public reflections to the community tab as they are created"""
+    try:
+        await get_user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    await reflection_hub.serve(websocket, reflection_hub.subscribe())
+
+async def watch_public_reflections():
+    """Feed the live hub from a change stream on the reflections collection"""
+    pipeline = [{"$match": {"operationType": "insert", "fullDocument.is_public": True}}]
+    resume_token = None
+    while True:
+        try:
+            async with db.reflections.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    r = change["fullDocument"]
+                    reflection_hub.publish({"type": "reflection", "data": {
+                        "id": str(r["_id"]),
+                        "user_name": r["user_name"],
+                        "content": r["content"],
+                        "type": r["type"],
+                        "date": r["date"].isoformat(),
+                        "amen_count": 0
+                    }})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reflections change stream failed, retrying: {str(e)}")
+            await asyncio.sleep(5)
+
+# ============ EXPORT / IMPORT ============
+
+@api_router.get("/export")
+async def export_journal(format: str = "ndjson", current_user = Depends(get_current_user)):
+    """Stream every prayer, gratitude, devotional and reflection of the user"""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+    
+    records = iter_journal(db, owner_filter(current_user), music_catalog.attach)
+    if format == "csv":
+        body, media_type = csv_stream(records), "text/csv; charset=utf-8"
+    else:
+        body, media_type = ndjson_stream(records), "application/x-ndjson"
+    
+    filename = f"diario-{datetime.utcnow().date().isoformat()}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/import")
+async def import_journal(request: Request, current_user = Depends(get_current_user)):
+    """Import prayers and gratitudes from an NDJSON upload, one record per line"""
+    importer = JournalImporter(db, user_key(current_user), owner_filter(current_user), {
+        "prayer": ("prayers", PrayerCreate),
+        "gratitude": ("gratitudes", GratitudeCreate),
+    })
+    await importer.run(request.stream())
+    return importer.report()
+
+# ============ ADMIN ============
+
+@api_router.get("/admin/profiles")
+async def list_profiles(admin = Depends(get_admin_user)):
+    """Most recent request profiles, newest first"""
+    if profile_store is None:
+        raise HTTPException(status_code=503, detail="Profiler not enabled")
+    return await asyncio.to_thread(profile_store.list)
+
+@api_router.get("/admin/profiles/{name}")
+async def download_profile(name: str, admin = Depends(get_admin_user)):
+    """Download a profile in folded-stack format (flamegraph.pl, speedscope)"""
+    path = profile_store.path(name) if profile_store is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+@api_router.get("/admin/metrics")
+async def get_metrics(format: str = "json", admin = Depends(get_admin_user)):
+    """Process metrics as JSON or in the Prometheus text format"""
+    if format == "prometheus":
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+    return registry.snapshot()
+
+@api_router.get("/admin/blocking")
+async def get_blocking_reports(admin = Depends(get_admin_user)):
+    """Stacks of recent callbacks that blocked the event loop, newest first"""
+    if blocking_detector is None:
+        raise HTTPException(status_code=503, detail="Blocking detector not enabled")
+    return blocking_detector.recent()
+
+# ============ TIERING ============
+
+async def run_tiering():
+    """Periodically move old devotionals and reflections to their archive collections"""
+    policies = [
+        ("devotionals", DEVOTIONALS_HOT_DAYS, DEVOTIONALS_ARCHIVE_TTL_DAYS),
+        ("reflections", REFLECTIONS_HOT_DAYS, REFLECTIONS_ARCHIVE_TTL_DAYS),
     ]
+    interval = TIERING_INTERVAL_HOURS * 3600
+    while True:
+        try:
+            # Only one worker per interval does the move
+            if await try_acquire_lease(db, "tiering", WORKER_ID, interval):
+                for name, horizon_days, ttl_days in policies:
+                    await ensure_archive_indexes(db, name, ttl_days or None)
+                    await archive_older_than(db, name, horizon_days, ARCHIVE_COMPRESS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in tiering job: {str(e)}")
+        await asyncio.sleep(interval)
+
+# ============ SIMILARITY INDEX ============
+
+async def index_devotionals(source: str, query: dict) -> Optional[ObjectId]:
+    last_id = None
+    projection = {"title": 1, "content": 1, "verse_reference": 1, "theme": 1, "fallback": 1, "locale": 1, "z": 1}
+    async for d in db[source].find(query, projection).sort("_id", 1).batch_size(1000):
+        if "z" in d:
+            d = unpack(d)
+        locale = d.get("locale") if d.get("locale") in similarity_indexes else DEFAULT_LOCALE
+        similarity_indexes[locale].add(str(d["_id"]), devotional_text(d))
+        if not d.get("fallback"):
+            theme_indexes[locale].add(str(d["_id"]), devotional_theme_text(d))
+        last_id = d["_id"]
+    return last_id
+
+async def run_similarity_indexer():
+    """Build the devotional similarity index, then pick up devotionals from other workers"""
+    last_id = None
+    try:
+        await index_devotionals("devotionals_archive", {})
+        last_id = await index_devotionals("devotionals", {})
+        sizes = ", ".join(f"{locale}: {len(index)}" for locale, index in similarity_indexes.items())
+        logger.info(f"Similarity indexes built with {sizes} devotionals")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error building similarity index: {str(e)}")
+    while True:
+        await asyncio.sleep(SIMILARITY_REFRESH_SECONDS)
+        try:
+            newest = await index_devotionals("devotionals", {"_id": {"$gt": last_id}} if last_id else {})
+            last_id = newest or last_id
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error refreshing similarity index: {str(e)}")
+
+# ============ MIGRATIONS ============
+
+async def run_user_key_backfill():
+    """Rewrite email user_id values to ObjectIds in the background"""
+    try:
+        # Held for the whole run; another worker picks it up if this one dies
+        if await try_acquire_lease(db, "user_key_backfill", WORKER_ID, 3600):
+            migrated = await user_keys.backfill_user_keys(db)
+            logger.info(f"User key backfill finished, {migrated} documents migrated")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in user key backfill: {str(e)}")
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost, so replayed responses still get CORS headers and compression
+if IDEMPOTENCY_ENABLED:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        db=db,
+        paths=IDEMPOTENT_PATHS,
+        ttl_hours=IDEMPOTENCY_TTL_HOURS,
+        local_maxsize=IDEMPOTENCY_LOCAL_MAXSIZE,
+        wait_timeout=IDEMPOTENCY_WAIT_SECONDS,
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -574,6 +1535,212 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+)
+
+app.add_middleware(RequestIdMiddleware)
+
+if profile_store is not None:
+    app.add_middleware(
+        ProfilerMiddleware,
+        store=profile_store,
+        sample_rate=PROFILER_SAMPLE_RATE,
+        routes=PROFILER_ROUTES,
+        header_token=PROFILER_HEADER_TOKEN,
+        interval=PROFILER_INTERVAL_MS / 1000,
+        max_concurrent=PROFILER_MAX_CONCURRENT,
+    )
+
+@app.on_event("startup")
+async def ensure_indexes():
+    for collection_name in ("prayers", "gratitudes", "devotionals", "reflections"):
+        await db[collection_name].create_index([("user_id", 1), ("date", -1)])
+    # Import deduplication looks entries up by content hash
+    for collection_name in ("prayers", "gratitudes"):
+        await db[collection_name].create_index([("user_id", 1), ("content_hash", 1)])
+    if IDEMPOTENCY_ENABLED:
+        await ensure_idempotency_indexes(db)
+
+@app.on_event("startup")
+async def start_monitoring():
+    for cache in (user_cache, devotional_cache, feed_cache):
+        registry.register_collector(f"cache_{cache.namespace}", cache.stats)
+    registry.register_collector("reflection_hub", reflection_hub.stats)
+    registry.register_collector("reactions", amen_reactions.stats)
+    registry.register_collector("logging", lambda: {"dropped": log_handler.dropped})
+    if write_behind is not None:
+        registry.register_collector("write_behind", write_behind.stats)
+    if write_journal is not None:
+        registry.register_collector("write_journal", write_journal.stats)
+    if job_pool is not None:
+        registry.register_collector("jobs", job_pool.stats)
+    if llm_cache is not None:
+        registry.register_collector("llm_cache", llm_cache.stats)
+    registry.register_collector("cards", card_renderer.stats)
+    if reminder_scheduler is not None:
+        registry.register_collector("reminders", reminder_scheduler.stats)
+    if similarity_indexes is not None:
+        registry.register_collector("similarity_index", lambda: {
+            "documents": {locale: len(index) for locale, index in similarity_indexes.items()},
+            "themes": {locale: len(index) for locale, index in theme_indexes.items()}
+        })
+    if loop_lag_monitor is not None:
+        loop_lag_monitor.start()
+    if blocking_detector is not None:
+        blocking_detector.start()
+
+@app.on_event("shutdown")
+async def stop_monitoring():
+    if loop_lag_monitor is not None:
+        loop_lag_monitor.stop()
+    if blocking_detector is not None:
+        blocking_detector.stop()
+
+@app.on_event("startup")
+async def start_user_key_backfill():
+    if USER_KEY_BACKFILL and USER_KEY_MODE != "email":
+        app.state.user_key_backfill = asyncio.create_task(run_user_key_backfill())
+
+@app.on_event("startup")
+async def start_caches():
+    for cache in (user_cache, devotional_cache, feed_cache):
+        await cache.start()
+
+@app.on_event("startup")
+async def start_write_behind():
+    if write_behind is not None:
+        write_behind.start()
+
+@app.on_event("startup")
+async def start_write_journal():
+    if write_journal is not None:
+        write_journal.start()
+
+@app.on_event("startup")
+async def start_reactions():
+    await amen_reactions.ensure_indexes()
+    amen_reactions.start()
+
+@app.on_event("startup")
+async def start_reflections_watcher():
+    if REFLECTIONS_CHANGE_STREAM:
+        app.state.reflections_watcher = asyncio.create_task(watch_public_reflections())
+
+@app.on_event("startup")
+async def start_tiering():
+    if TIERING_ENABLED:
+        app.state.tiering = asyncio.create_task(run_tiering())
+
+@app.on_event("shutdown")
+async def stop_reflections_watcher():
+    watcher = getattr(app.state, "reflections_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+
+@app.on_event("startup")
+async def start_similarity_indexer():
+    if similarity_indexes is not None:
+        app.state.similarity_indexer = asyncio.create_task(run_similarity_indexer())
+
+@app.on_event("startup")
+async def start_music_catalog():
+    app.state.music_catalog = asyncio.create_task(run_music_catalog())
+
+@app.on_event("shutdown")
+async def stop_music_catalog():
+    task = getattr(app.state, "music_catalog", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("startup")
+async def start_jobs():
+    await job_queue.ensure_indexes()
+    if job_pool is not None:
+        job_pool.start()
+
+@app.on_event("startup")
+async def start_card_renderer():
+    card_renderer.start()
+
+@app.on_event("shutdown")
+async def stop_card_renderer():
+    card_renderer.close()
+
+@app.on_event("startup")
+async def start_llm_cache():
+    if llm_cache is not None:
+        await llm_cache.ensure_indexes()
+
+@app.on_event("startup")
+async def start_reminders():
+    if reminder_scheduler is not None:
+        await reminder_scheduler.ensure_indexes()
+        reminder_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_reminders():
+    if reminder_scheduler is not None:
+        await reminder_scheduler.close()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    if job_pool is not None:
+        await job_pool.close()
+
+@app.on_event("shutdown")
+async def stop_llm_cache():
+    # After the job workers, which may still be generating
+    if llm_cache is not None:
+        llm_cache.close()
+
+@app.on_event("shutdown")
+async def stop_similarity_indexer():
+    indexer = getattr(app.state, "similarity_indexer", None)
+    if indexer is not None:
+        indexer.cancel()
+
+@app.on_event("shutdown")
+async def stop_user_key_backfill():
+    backfill = getattr(app.state, "user_key_backfill", None)
+    if backfill is not None:
+        backfill.cancel()
+
+@app.on_event("shutdown")
+async def stop_tiering():
+    tiering = getattr(app.state, "tiering", None)
+    if tiering is not None:
+        tiering.cancel()
+
+@app.on_event("shutdown")
+async def flush_write_behind():
+    # Must run before the Mongo client is closed
+    if write_behind is not None:
+        await write_behind.close()
+
+@app.on_event("shutdown")
+async def close_write_journal():
+    if write_journal is not None:
+        await write_journal.close()
+
+@app.on_event("shutdown")
+async def flush_reactions():
+    # Must run before the Mongo client is closed
+    await amen_reactions.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_caches():
+    if shared_cache is not None:
+        await shared_cache.close()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    # Last, so records from the other shutdown handlers are written
+    log_listener.stop()
@@ -0,0 +1,197 @@
+"""Verse share cards.
+
+A card is a square PNG with a devotional's verse and reference on a themed
+background. Cards are content-addressed: the file name is a hash of the
+template version, theme and text, so the same verse on the same theme is
+rendered once however many devotionals quote it, and a cached card never
+needs invalidating.
+
+Rendering runs in a process pool (started with ``spawn``, so the workers do
+not inherit the server's threads or sockets) to keep Pillow's CPU time off
+the event loop. Concurrent requests for a card that is not on disk yet
+share one render.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes, so cards rendered with the old one are not reused
+TEMPLATE_VERSION = 1
+CARD_SIZE = 1080
+MARGIN = 110
+CARD_SUFFIX = ".png"
+
+THEMES = {
+    "light": {"top": (255, 248, 235), "bottom": (247, 222, 190), "text": (62, 44, 30), "accent": (176, 112, 52)},
+    "dark": {"top": (28, 32, 48), "bottom": (54, 44, 74), "text": (240, 236, 226), "accent": (226, 186, 120)},
+}
+BRAND = "Devocional Diário"
+# Pillow's built-in font has no accented letters, so a system font is preferred
+FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSerif.ttf",
+    "/Library/Fonts/Georgia.ttf",
+)
+
+
+def card_hash(verse: str, reference: str, theme: str, font_path: Optional[str] = None) -> str:
+    font = os.path.basename(font_path) if font_path else "default"
+    return hashlib.sha256(f"{TEMPLATE_VERSION}\n{font}\n{theme}\n{reference}\n{verse}".encode("utf-8")).hexdigest()
+
+
+def find_font(font_path: Optional[str] = None) -> Optional[str]:
+    if font_path:
+        return font_path
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    logger.warning("No TrueType font found for share cards; accented letters will not render (set CARD_FONT_PATH)")
+    return None
+
+
+def _font(font_path: Optional[str], size: int):
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size=size)
+
+
+def _wrap(draw: ImageDraw.ImageDraw, text: str, font, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and draw.textlength(candidate, font=font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def render_card(verse: str, reference: str, theme: str, path: str, font_path: Optional[str] = None):
+    """Render a card to ``path``. Runs in a worker process."""
+    colors = THEMES[theme]
+    image = Image.new("RGB", (CARD_SIZE, CARD_SIZE))
+    draw = ImageDraw.Draw(image)
+    for y in range(CARD_SIZE):
+        t = y / (CARD_SIZE - 1)
+        draw.line(
+            [(0, y), (CARD_SIZE, y)],
+            fill=tuple(round(a + (b - a) * t) for a, b in zip(colors["top"], colors["bottom"]))
+        )
+
+    width = CARD_SIZE - 2 * MARGIN
+    # Shrink the verse until it fits the space left for it
+    size = 64
+    while True:
+        font = _font(font_path, size)
+        lines = _wrap(draw, f"“{verse.strip()}”", font, width)
+        line_height = round(size * 1.35)
+        if len(lines) * line_height <= CARD_SIZE - 2 * MARGIN - 160 or size <= 28:
+            break
+        size -= 4
+
+    y = (CARD_SIZE - len(lines) * line_height - 120) // 2
+    for line in lines:
+        draw.text((CARD_SIZE / 2, y), line, font=font, fill=colors["text"], anchor="ma")
+        y += line_height
+
+    draw.text((CARD_SIZE / 2, y + 50), reference, font=_font(font_path, 44), fill=colors["accent"], anchor="ma")
+    draw.text((CARD_SIZE / 2, CARD_SIZE - MARGIN / 2), BRAND, font=_font(font_path, 30), fill=colors["accent"], anchor="md")
+
+    # Written under a temporary name, so a half-written card is never served
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    image.save(tmp, format="PNG", optimize=True)
+    os.replace(tmp, path)
+
+
+class CardRenderer:
+    """Content-addressed card cache in one directory, keeping at most ``max_files`` cards."""
+
+    def __init__(self, directory: str, workers: int = 2, font_path: Optional[str] = None, max_files: int = 5000):
+        self.directory = Path(directory)
+        self.workers = workers
+        self.font_path = font_path
+        self.max_files = max_files
+        self.rendered = 0
+        self.hits = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.font_path = find_font(self.font_path)
+        self._pool = self._new_pool()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{CARD_SUFFIX}"
+
+    async def render(self, verse: str, reference: str, theme: str) -> Path:
+        """Path of the card for this verse and theme, rendering it if it is not on disk."""
+        key = card_hash(verse, reference, theme, self.font_path)
+        path = self.path_for(key)
+        if path.exists():
+            self.hits += 1
+            return path
+
+        # A task of its own, so the render finishes even if the request that started it goes away
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._render(verse, reference, theme, path))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, verse: str, reference: str, theme: str, path: Path) -> Path:
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._pool, render_card, verse, reference, theme, str(path), self.font_path
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool for the next renders
+            logger.error(f"Card render pool broke while rendering {path.name}, restarting it")
+            self._pool.shutdown(wait=False)
+            self._pool = self._new_pool()
+            raise
+        except Exception as e:
+            logger.error(f"Rendering card {path.name} failed: {str(e)}")
+            raise
+        self.rendered += 1
+        await asyncio.to_thread(self._rotate)
+        return path
+
+    def _rotate(self):
+        with self._lock:
+            files = list(self.directory.glob("*" + CARD_SUFFIX))
+            if len(files) <= self.max_files:
+                return
+            # Least recently read first, where the filesystem records access times
+            files.sort(key=lambda p: max(p.stat().st_atime, p.stat().st_mtime))
+            for old in files[:len(files) - self.max_files]:
+                old.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"rendered": self.rendered, "hits": self.hits, "rendering": len(self._inflight)}
@@ -0,0 +1,132 @@
+"""Hashed TF-IDF similarity index over generated devotionals.
+
+Every devotional is turned into a fixed-width vector of log term frequencies
+(feature hashing, so the vocabulary never has to be stored) and appended to
+a NumPy matrix that grows by doubling. Document frequencies are kept per
+bucket, and IDF weights are applied at query time, so adding a document
+never requires re-weighting the matrix. Queries are scored in batches with
+a single matrix product.
+
+Identical texts are indexed once, which keeps the matrix small when the same
+content is served to many users.
+"""
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e ela ele em entre era essa esse esta este eu
+foi for ha isso la mais mas me mesmo meu minha na nao nas nem no nos nossa nosso num
+o os ou para pela pelo por porque quando que se sem ser seu sua suas seus so sobre
+sua tambem te tem ter teu tua um uma voce voces vos
+""".split())
+
+_WORD = re.compile(r"[a-z]{3,}")
+
+
+def tokenize(text: str) -> List[str]:
+    folded = "".join(
+        c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn"
+    )
+    tokens = []
+    for word in _WORD.findall(folded):
+        if word in STOPWORDS:
+            continue
+        # Light stemming: fold simple plurals together
+        if len(word) > 4 and word.endswith("s"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def text_fingerprint(text: str) -> str:
+    return hashlib.sha1(" ".join(tokenize(text)).encode("utf-8")).hexdigest()
+
+
+class SimilarityIndex:
+    def __init__(self, dim: int = 512, initial_capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._ids: List[str] = []
+        self._fingerprints: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        np.log1p(vector, out=vector)
+        return vector
+
+    def add(self, doc_id: str, text: str) -> bool:
+        """Index ``text`` under ``doc_id``; returns False for already indexed content."""
+        fingerprint = text_fingerprint(text)
+        if fingerprint in self._fingerprints:
+            return False
+        vector = self._vectorize(text)
+        if not vector.any():
+            return False
+
+        row = len(self._ids)
+        if row == self._matrix.shape[0]:
+            grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+            grown[:row] = self._matrix
+            self._matrix = grown
+        self._matrix[row] = vector
+        self._df += vector > 0
+        self._ids.append(doc_id)
+        self._fingerprints[fingerprint] = row
+        return True
+
+    def contains_text(self, text: str) -> bool:
+        return text_fingerprint(text) in self._fingerprints
+
+    def search_many(self, queries: Sequence[str], k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Top-``k`` ``(doc_id, cosine score)`` pairs for each query, in one matrix product.
+
+        Safe to run in a worker thread while the event loop keeps adding
+        documents: it works on a snapshot of the rows present when it starts.
+        """
+        count = len(self._ids)
+        if count == 0 or not queries:
+            return [[] for _ in queries]
+        matrix = self._matrix[:count]
+        ids = self._ids[:count]
+        idf = (np.log((1.0 + count) / (1.0 + self._df)) + 1.0).astype(np.float32)
+        idf_squared = idf * idf
+
+        weighted_queries = np.stack([self._vectorize(q) for q in queries]) * idf
+        query_norms = np.linalg.norm(weighted_queries, axis=1)
+        doc_norms = np.sqrt((matrix * matrix) @ idf_squared)
+        doc_norms[doc_norms == 0] = 1.0
+
+        # (count x dim) @ (dim x batch): cosine over idf-weighted vectors
+        scores = (matrix @ (weighted_queries * idf).T) / doc_norms[:, None]
+        results = []
+        top = min(k, count)
+        for column, query_norm in enumerate(query_norms):
+            if query_norm == 0:
+                results.append([])
+                continue
+            column_scores = scores[:, column] / query_norm
+            best = np.argpartition(-column_scores, top - 1)[:top]
+            best = best[np.argsort(-column_scores[best])]
+            results.append([(ids[i], float(column_scores[i])) for i in best if column_scores[i] > 0])
+        return results
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        return self.search_many([query], k)[0]
+
+    def best_match(self, query: str, threshold: float) -> Optional[Tuple[str, float]]:
+        matches = self.search(query, 1)
+        if matches and matches[0][1] >= threshold:
+            return matches[0]
+        return None
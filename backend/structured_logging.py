@@ -0,0 +1,162 @@
+"""Non-blocking JSON logging with per-request correlation ids.
+
+Records are formatted as one JSON object per line by a ``QueueListener``
+thread; the event loop only puts records on a bounded queue, dropping them
+(and counting the drops) rather than waiting when the writer falls behind.
+
+The current request id lives in a context variable set by
+``RequestIdMiddleware``. It is stamped on each record when the record is
+created, so it survives the hop to the writer thread, and it follows the
+request into Motor's executor threads (Motor copies the context), where
+``MongoCommandLogger`` runs.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+_TRACEBACKS = logging.Formatter()
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp the request id and sample records at INFO and below."""
+
+    def __init__(self, info_sample_rate: float = 1.0):
+        super().__init__()
+        self.info_sample_rate = info_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.INFO and self.info_sample_rate < 1.0 and random.random() >= self.info_sample_rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but keeps the traceback out of the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACKS.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: int = logging.INFO, json_format: bool = True, info_sample_rate: float = 1.0,
+                  queue_size: int = 10000) -> Tuple[DroppingQueueHandler, logging.handlers.QueueListener]:
+    """Route the root logger (and uvicorn's) through a queue.
+
+    Returns the queue handler (for its drop count) and the started listener.
+    """
+    writer = logging.StreamHandler(sys.stderr)
+    if json_format:
+        writer.setFormatter(JsonFormatter())
+    else:
+        writer.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(ContextFilter(info_sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    # uvicorn installs its own synchronous handlers before importing the app
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+    listener.start()
+    return handler, listener
+
+
+class RequestIdMiddleware:
+    """Use the caller's X-Request-ID (or a new one) for the request and echo it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        token = request_id_var.set(request_id[:64])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message.setdefault("headers", []))["X-Request-ID"] = request_id_var.get()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class MongoCommandLogger(monitoring.CommandListener):
+    """Log every command at DEBUG, slow and failed ones at WARNING."""
+
+    def __init__(self, slow_ms: float = 100):
+        self.slow_ms = slow_ms
+        self.logger = logging.getLogger("mongo")
+
+    def started(self, event):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{event.command_name} on {event.database_name} started (#{event.request_id})")
+
+    def succeeded(self, event):
+        took_ms = event.duration_micros / 1000
+        # getMore on change streams and tailable cursors waits for data by design
+        if took_ms >= self.slow_ms and event.command_name != "getMore":
+            self.logger.warning(f"Slow {event.command_name}: {took_ms:.1f} ms (#{event.request_id})")
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{event.command_name} took {took_ms:.1f} ms (#{event.request_id})")
+
+    def failed(self, event):
+        self.logger.warning(
+            f"{event.command_name} failed after {event.duration_micros / 1000:.1f} ms: {event.failure} (#{event.request_id})"
+        )
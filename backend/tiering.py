@@ -0,0 +1,103 @@
+"""Hot/cold tiering for collections that only ever grow.
+
+Documents older than a horizon are moved from ``<name>`` into
+``<name>_archive`` in batches. Archived documents keep their ``_id``,
+``user_id`` and ``date`` as plain fields (so they stay queryable) and, when
+compression is on, the rest of the document is stored as one zlib-compressed
+BSON blob. Moves are idempotent: a batch interrupted between the insert and
+the delete is simply retried.
+
+An optional TTL index on ``archived_at`` expires archived documents for
+collections where deletion is acceptable.
+"""
+
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import bson
+from bson.binary import Binary
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ("_id", "user_id", "date")
+DUPLICATE_KEY = 11000
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def archive_name(collection_name: str) -> str:
+    return f"{collection_name}_archive"
+
+
+def pack(document: dict, compress: bool, archived_at: datetime) -> dict:
+    archived = {key: document[key] for key in KEY_FIELDS if key in document}
+    rest = {key: value for key, value in document.items() if key not in KEY_FIELDS}
+    if compress:
+        archived["z"] = Binary(zlib.compress(bson.encode(rest), 6))
+    else:
+        archived.update(rest)
+    archived["archived_at"] = archived_at
+    return archived
+
+
+def unpack(archived: dict) -> dict:
+    document = {key: value for key, value in archived.items() if key not in ("z", "archived_at")}
+    if "z" in archived:
+        document.update(bson.decode(zlib.decompress(archived["z"])))
+    return document
+
+
+async def ensure_archive_indexes(db, collection_name: str, ttl_days: Optional[int] = None):
+    archive = db[archive_name(collection_name)]
+    await archive.create_index([("user_id", ASCENDING), ("date", DESCENDING)])
+    if not ttl_days:
+        return
+    expire = int(timedelta(days=ttl_days).total_seconds())
+    try:
+        await archive.create_index("archived_at", expireAfterSeconds=expire)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        # TTL changed since the index was created: update it in place
+        await db.command("collMod", archive.name, index={"keyPattern": {"archived_at": 1}, "expireAfterSeconds": expire})
+
+
+async def archive_older_than(
+    db,
+    collection_name: str,
+    horizon_days: int,
+    compress: bool = True,
+    batch_size: int = 500,
+) -> int:
+    """Move documents whose ``date`` is older than the horizon; returns how many moved."""
+    source = db[collection_name]
+    archive = db[archive_name(collection_name)]
+    cutoff = datetime.utcnow() - timedelta(days=horizon_days)
+    moved = 0
+
+    while True:
+        batch = await source.find({"date": {"$lt": cutoff}}).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        archived_at = datetime.utcnow()
+        try:
+            await archive.insert_many([pack(d, compress, archived_at) for d in batch], ordered=False)
+        except BulkWriteError as e:
+            # Already archived by an earlier, interrupted run
+            if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+        await source.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+        moved += len(batch)
+
+    if moved:
+        logger.info(f"Archived {moved} documents from {collection_name}")
+    return moved
+
+
+async def read_archive(db, collection_name: str, query: dict, skip: int = 0, limit: int = 30) -> List[dict]:
+    """On-demand read path into the cold tier, newest first."""
+    archived = await db[archive_name(collection_name)].find(query).sort("date", DESCENDING).skip(skip).limit(limit).to_list(limit)
+    return [unpack(d) for d in archived]
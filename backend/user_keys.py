@@ -0,0 +1,80 @@
+"""Migration of ``user_id`` from the user's email to the user's ObjectId.
+
+Rollout happens in three steps, selected by ``USER_KEY_MODE``:
+
+* ``email``: legacy behaviour, documents are written and read by email.
+* ``dual``: new documents are written with the ObjectId and reads match
+  either key, while ``backfill_user_keys`` rewrites existing documents.
+* ``objectid``: once the backfill has finished, only ObjectIds are used.
+
+The 12-byte ObjectId keeps compound ``user_id`` indexes far smaller than
+variable-length email strings and lets users change their email.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_KEYED_COLLECTIONS = (
+    "prayers",
+    "gratitudes",
+    "devotionals",
+    "reflections",
+    "devotionals_archive",
+    "reflections_archive",
+)
+
+USER_KEY_MODES = ("email", "dual", "objectid")
+
+
+def user_key(user: dict, mode: str):
+    """Value to store in ``user_id`` for documents owned by ``user``."""
+    return user["email"] if mode == "email" else user["_id"]
+
+
+def owner_filter(user: dict, mode: str) -> dict:
+    """Query fragment matching documents owned by ``user``."""
+    if mode == "email":
+        return {"user_id": user["email"]}
+    if mode == "dual":
+        return {"user_id": {"$in": [user["_id"], user["email"]]}}
+    return {"user_id": user["_id"]}
+
+
+async def backfill_user_keys(db, batch_size: int = 500) -> int:
+    """Rewrite email ``user_id`` values to ObjectIds; safe to run online and to resume.
+
+    Progress is checkpointed by user ``_id`` in the ``migrations`` collection.
+    Run it once every worker writes ObjectIds (``dual`` mode); returns the
+    number of documents rewritten by this run.
+    """
+    checkpoint = await db.migrations.find_one({"_id": "user_keys"}) or {}
+    if checkpoint.get("done"):
+        return 0
+
+    last_id = checkpoint.get("last_user_id")
+    total = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        users = await db.users.find(query, {"email": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        migrated = 0
+        for user in users:
+            for collection_name in USER_KEYED_COLLECTIONS:
+                result = await db[collection_name].update_many(
+                    {"user_id": user["email"]},
+                    {"$set": {"user_id": user["_id"]}}
+                )
+                migrated += result.modified_count
+        last_id = users[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": "user_keys"},
+            {"$set": {"last_user_id": last_id}, "$inc": {"migrated": migrated}},
+            upsert=True
+        )
+        total += migrated
+        logger.info(f"User key backfill: {migrated} documents migrated up to user {last_id}")
+
+    await db.migrations.update_one({"_id": "user_keys"}, {"$set": {"done": True}}, upsert=True)
+    return total
@@ -0,0 +1,143 @@
+"""Write-behind batching for insert-heavy collections.
+
+Inserts are buffered per collection and flushed with ``insert_many`` when a
+collection reaches ``batch_size`` documents or every ``flush_interval``
+seconds, whichever comes first. ObjectIds are allocated up front so callers
+can return an ``id`` before the document reaches MongoDB.
+
+At most ``max_pending`` documents are ever held in memory: once the cap is
+reached an insert waits for a flush, and fails if the buffer cannot be
+drained, so the worst-case loss window on a crash is bounded by both the cap
+and the flush interval. ``close()`` flushes everything on shutdown.
+
+Documents rejected by MongoDB for anything but a duplicate key are requeued
+and retried up to ``max_attempts`` times in all, then dropped and counted in
+``stats()``.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        db,
+        batch_size: int = 100,
+        flush_interval: float = 0.2,
+        max_pending: int = 1000,
+        max_attempts: int = 3,
+        on_flush: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.on_flush = on_flush
+        self.flushed = 0
+        self.dropped = 0
+        self._buffers: Dict[str, List[dict]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Failed attempts of requeued documents, by _id
+        self._attempts: Dict[ObjectId, int] = {}
+        # Flushes started by insert; referenced so they are not garbage collected
+        self._flushes: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+    async def insert(self, collection_name: str, document: dict) -> ObjectId:
+        """Buffer a copy of ``document`` and return its pre-allocated ``_id``."""
+        if self.pending >= self.max_pending:
+            await self.flush()
+            if self.pending >= self.max_pending:
+                raise RuntimeError("Write-behind buffer is full and could not be flushed")
+
+        # A copy: the caller's dict is not ours to keep or to write back
+        document = dict(document, _id=document["_id"] if "_id" in document else ObjectId())
+        buffer = self._buffers.setdefault(collection_name, [])
+        buffer.append(document)
+        if len(buffer) >= self.batch_size:
+            task = asyncio.create_task(self._flush_collection(collection_name))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return document["_id"]
+
+    async def _flush_collection(self, collection_name: str):
+        lock = self._locks.setdefault(collection_name, asyncio.Lock())
+        async with lock:
+            batch = self._buffers.get(collection_name)
+            if not batch:
+                return
+            self._buffers[collection_name] = []
+            try:
+                await self.db[collection_name].insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates come from a retried batch that partially landed
+                errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+                failed = {err["index"] for err in errors}
+                retry = []
+                for index in sorted(failed):
+                    document = batch[index]
+                    attempts = self._attempts.pop(document["_id"], 0) + 1
+                    if attempts < self.max_attempts:
+                        self._attempts[document["_id"]] = attempts
+                        retry.append(document)
+                    else:
+                        self.dropped += 1
+                if errors:
+                    logger.error(
+                        f"Write-behind flush to {collection_name} failed for {len(errors)} documents, "
+                        f"requeueing {len(retry)}: {errors[0].get('errmsg')}"
+                    )
+                self._buffers[collection_name] = retry + self._buffers[collection_name]
+                batch = [document for index, document in enumerate(batch) if index not in failed]
+            except Exception as e:
+                logger.error(f"Write-behind flush to {collection_name} failed, requeueing {len(batch)} documents: {str(e)}")
+                self._buffers[collection_name] = batch + self._buffers[collection_name]
+                return
+            if self._attempts:
+                for document in batch:
+                    self._attempts.pop(document["_id"], None)
+            self.flushed += len(batch)
+
+        if self.on_flush is not None:
+            try:
+                await self.on_flush(collection_name, batch)
+            except Exception as e:
+                logger.warning(f"Write-behind on_flush hook failed: {str(e)}")
+
+    async def flush(self):
+        await asyncio.gather(*(self._flush_collection(name) for name in list(self._buffers)))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+        if self.pending:
+            logger.error(f"Write-behind shutdown left {self.pending} documents unflushed")
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "flushed": self.flushed, "dropped": self.dropped}
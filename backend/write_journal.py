@@ -0,0 +1,292 @@
+"""Local write-ahead journal for inserts while MongoDB is degraded.
+
+Inserts go straight to MongoDB while it answers within ``slo`` seconds. When
+an insert misses the SLO or the connection fails, the journal takes over:
+the document (with its pre-allocated ``_id``, which is what the client gets
+back) is appended to a local file and the call returns once the line is
+fsynced. Appends are group-committed: lines arriving within
+``fsync_interval`` share a single write and fsync.
+
+While the journal holds entries every insert goes through it, so nothing
+overtakes an earlier write. A replay task pings MongoDB every
+``replay_interval`` seconds and, once it answers, applies the entries in
+journal order with ordered ``insert_many`` batches, then truncates the file
+and switches back to direct inserts. Replay is idempotent: an entry whose
+``_id`` is already stored (the timed-out insert may have landed after all)
+is skipped, so the file can be replayed again from the start after a crash.
+
+Each worker writes its own ``<worker>.journal`` and holds an exclusive
+``flock`` on it. Files left by workers that are gone (the lock is free) are
+replayed and removed by whichever worker finds them first.
+
+Journaled documents are not visible to reads until they are replayed.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from bson import ObjectId, json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def encode_entry(collection_name: str, document: dict) -> bytes:
+    return (json_util.dumps({"c": collection_name, "d": document}, json_options=CANONICAL_JSON_OPTIONS) + "\n").encode("utf-8")
+
+
+def decode_entries(data: bytes) -> List[tuple]:
+    """Complete entries in ``data`` as ``(collection name, document)``; a torn last line is ignored."""
+    entries = []
+    for line in data.split(b"\n")[:-1]:
+        if line:
+            entry = json_util.loads(line, json_options=CANONICAL_JSON_OPTIONS)
+            entries.append((entry["c"], entry["d"]))
+    return entries
+
+
+class WriteJournal:
+    def __init__(
+        self,
+        db,
+        directory,
+        worker_id: str,
+        slo: float = 0.5,
+        fsync_interval: float = 0.005,
+        replay_interval: float = 5.0,
+        replay_batch_size: int = 500,
+        on_replay: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.directory = Path(directory)
+        self.path = self.directory / f"{worker_id.replace(':', '-').replace('/', '-')}.journal"
+        self.slo = slo
+        self.fsync_interval = fsync_interval
+        self.replay_interval = replay_interval
+        self.replay_batch_size = replay_batch_size
+        self.on_replay = on_replay
+        self.degraded = False
+        self.appended = 0
+        self.replayed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.fsyncs = 0
+        self.max_fsync_ms = 0.0
+        self._file = None
+        self._size = 0
+        self._replayed_offset = 0
+        self._lines: List[bytes] = []
+        self._group: Optional[asyncio.Future] = None
+        self._wakeup = asyncio.Event()
+        self._file_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    # ---- lifecycle ----
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._size = self._file.seek(0, os.SEEK_END)
+        if self._size and self._read(self.path, self._size - 1) != b"\n":
+            # Drop a line torn by a crash, so new entries do not get appended to it
+            self._size = self._read(self.path, 0).rfind(b"\n") + 1
+            self._file.truncate(self._size)
+        if self._size:
+            # Left by a previous run with the same worker id (e.g. a restarted container):
+            # replay it before any direct insert can overtake its entries
+            logger.warning(f"Write journal {self.path.name} has {self._size} bytes from a previous run, replaying")
+            self.degraded = True
+        self._tasks = [asyncio.create_task(self._run_fsync()), asyncio.create_task(self._run_replay())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._commit()
+        if self._size > self._replayed_offset:
+            # Replayed by the next worker to start, as an orphaned journal
+            logger.error(f"Write journal closed with {self._size - self._replayed_offset} bytes not replayed")
+        elif self._file is not None:
+            self.path.unlink(missing_ok=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ---- writes ----
+
+    async def insert(self, collection_name: str, document: dict) -> ObjectId:
+        """Insert a copy of ``document`` into MongoDB, or journal it if MongoDB is degraded; returns its ``_id``."""
+        # A copy: a timed-out insert may still be encoding it while the caller goes on
+        document = dict(document, _id=document["_id"] if "_id" in document else ObjectId())
+        if not self.degraded:
+            try:
+                # Shielded: a timed-out insert may still land, which replay tolerates
+                await asyncio.wait_for(asyncio.shield(self.db[collection_name].insert_one(document)), self.slo)
+                return document["_id"]
+            except (asyncio.TimeoutError, ConnectionFailure) as e:
+                logger.warning(f"Insert into {collection_name} missed the {self.slo * 1000:.0f} ms SLO, journaling: {e!r}")
+                self.degraded = True
+        await self._append(encode_entry(collection_name, document))
+        self.appended += 1
+        return document["_id"]
+
+    async def _append(self, line: bytes):
+        if self._group is None:
+            self._group = asyncio.get_running_loop().create_future()
+            self._wakeup.set()
+        group = self._group
+        self._lines.append(line)
+        await asyncio.shield(group)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _commit(self):
+        """Write and fsync the lines appended so far, then release their callers."""
+        async with self._file_lock:
+            lines, group = self._lines, self._group
+            self._lines, self._group = [], None
+            if group is None:
+                return
+            data = b"".join(lines)
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, data)
+            except Exception as e:
+                logger.error(f"Write journal fsync failed for {len(lines)} entries: {str(e)}")
+                group.set_exception(e)
+                return
+            self._size += len(data)
+            self.fsyncs += 1
+            self.max_fsync_ms = max(self.max_fsync_ms, (time.perf_counter() - started) * 1000)
+            group.set_result(None)
+
+    async def _run_fsync(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Let concurrent appends join the group before syncing
+            await asyncio.sleep(self.fsync_interval)
+            await self._commit()
+
+    # ---- replay ----
+
+    async def _run_replay(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            try:
+                await self._replay_orphans()
+                if self.degraded and await self._healthy():
+                    await self._replay_own()
+            except asyncio.CancelledError:
+                raise
+            except ConnectionFailure as e:
+                logger.warning(f"Write journal replay interrupted, retrying: {str(e)}")
+            except Exception as e:
+                logger.error(f"Write journal replay failed: {str(e)}")
+
+    async def _healthy(self) -> bool:
+        try:
+            await asyncio.wait_for(self.db.command("ping"), self.slo)
+            return True
+        except (asyncio.TimeoutError, ConnectionFailure):
+            return False
+
+    def _read(self, path: Path, offset: int, end: Optional[int] = None) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read() if end is None else f.read(end - offset)
+
+    async def _replay_own(self):
+        while True:
+            end = self._size
+            if end > self._replayed_offset:
+                data = await asyncio.to_thread(self._read, self.path, self._replayed_offset, end)
+                await self._apply(decode_entries(data))
+                self._replayed_offset = end
+                continue
+            async with self._file_lock:
+                caught_up = self._size == self._replayed_offset and not self._lines
+                if caught_up:
+                    # Start a fresh file and go back to direct inserts
+                    self._file.truncate(0)
+                    self._size = self._replayed_offset = 0
+                    self.degraded = False
+            if caught_up:
+                logger.info("Write journal replayed, inserting directly again")
+                return
+            # Appends are waiting for their fsync
+            await asyncio.sleep(self.fsync_interval)
+
+    async def _replay_orphans(self):
+        for path in self.directory.glob("*.journal"):
+            if path == self.path:
+                continue
+            with open(path, "rb") as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Still owned by a running worker
+                    continue
+                entries = decode_entries(await asyncio.to_thread(f.read))
+                if entries and not await self._healthy():
+                    return
+                await self._apply(entries)
+                path.unlink()
+            logger.info(f"Replayed {len(entries)} entries from orphaned write journal {path.name}")
+
+    async def _apply(self, entries: List[tuple]):
+        """Insert entries in order, in batches of consecutive entries for one collection."""
+        start = 0
+        while start < len(entries):
+            collection_name = entries[start][0]
+            end = start
+            while end < len(entries) and end - start < self.replay_batch_size and entries[end][0] == collection_name:
+                end += 1
+            batch = [document for _, document in entries[start:end]]
+            await self._insert_ordered(collection_name, batch)
+            self.replayed += len(batch)
+            if self.on_replay is not None:
+                try:
+                    await self.on_replay(collection_name, batch)
+                except Exception as e:
+                    logger.warning(f"Write journal on_replay hook failed: {str(e)}")
+            start = end
+
+    async def _insert_ordered(self, collection_name: str, batch: List[dict]):
+        while batch:
+            try:
+                await self.db[collection_name].insert_many(batch, ordered=True)
+                return
+            except BulkWriteError as e:
+                # An ordered insert stops at the first error; skip that entry and go on
+                error = e.details["writeErrors"][0]
+                if error.get("code") == DUPLICATE_KEY:
+                    self.duplicates += 1
+                else:
+                    self.failed += 1
+                    logger.error(f"Write journal dropped an entry for {collection_name}: {error.get('errmsg')}")
+                batch = batch[error["index"] + 1:]
+
+    def stats(self) -> dict:
+        return {
+            "degraded": int(self.degraded),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "pending_bytes": self._size - self._replayed_offset,
+            "fsyncs": self.fsyncs,
+            "max_fsync_ms": round(self.max_fsync_ms, 3),
+        }